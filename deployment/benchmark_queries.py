@@ -0,0 +1,180 @@
+import argparse
+import inspect
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import compute
+from column_store import FrameColumnStore
+from data_refresh import build_snapshot
+from queries import DuckDBBackend, PandasBackend, write_parquet
+
+REGIONS = ['Africa', 'Asia', 'Europe', 'North America', 'Oceania', 'South America']
+
+
+def synthetic_data(n_countries, n_years, seed=0):
+    """CO2/GDP panel with the dashboard schema, lognormal levels and exponential trends"""
+    rng = np.random.default_rng(seed)
+    countries = np.array([f"Country {i:05d}" for i in range(n_countries)])
+    years = np.arange(2024 - n_years, 2024)
+
+    country_idx = np.repeat(np.arange(n_countries), n_years)
+    year_idx = np.tile(np.arange(n_years), n_countries)
+    co2_base = rng.lognormal(0, 1, n_countries)[country_idx]
+    gdp_base = rng.lognormal(8, 1, n_countries)[country_idx]
+
+    df = pd.DataFrame({
+        'country': countries[country_idx],
+        'region': np.array(REGIONS)[country_idx % len(REGIONS)],
+        'year': years[year_idx],
+        'co2': co2_base * np.exp(0.01 * year_idx + rng.normal(0, 0.1, len(country_idx))),
+        'gdp': gdp_base * np.exp(0.02 * year_idx + rng.normal(0, 0.1, len(country_idx)))
+    })
+    # Missing values like in the real dataset
+    df.loc[rng.random(len(df)) < 0.02, 'co2'] = np.nan
+    return df
+
+
+def workload(df):
+    """One representative call per named query, with the parameters a dashboard rerun uses"""
+    years = sorted(df['year'].unique())
+    countries = sorted(df['country'].unique())
+    mid_year = years[len(years) // 2]
+    return [
+        ('schema', {}),
+        ('overview', {}),
+        ('metric_values', {'metric': 'co2'}),
+        ('metric_extremes', {'metric': 'gdp', 'metrics': ('gdp', 'co2')}),
+        ('country_series', {'countries': tuple(countries[:5]), 'metrics': ('co2', 'gdp')}),
+        ('year_rows', {'year': mid_year, 'metrics': ('co2', 'gdp')}),
+        ('region_means', {'year': mid_year, 'metrics': ('co2', 'gdp')}),
+        ('year_correlation', {'x': 'co2', 'y': 'gdp'}),
+        ('metric_pairs', {'x': 'co2', 'y': 'gdp'}),
+    ]
+
+
+def time_query(backend, name, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.run(name, **params)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def compute_workload(snapshot):
+    """One call per compute function, with the arguments a dashboard rerun uses"""
+    years = snapshot.years
+    mid_year = years[len(years) // 2]
+    highlighted = tuple(snapshot.countries[:5])
+    return [
+        ('line_data', (highlighted, ('co2', 'gdp')), {}),
+        ('slope_data', (years[0], years[-1], highlighted, ('co2', 'gdp')), {}),
+        ('change_extremes', ('co2', years[0], years[-1]), {}),
+        ('top_movers', ('co2', years[0], years[-1]), {'k': 5}),
+        ('background_series', ('co2', 800), {}),
+        ('year_values', (mid_year, 'co2'), {}),
+        ('region_averages', (mid_year, 'co2'), {}),
+        ('year_correlation', ('co2', 'gdp'), {}),
+        ('windowed_correlation', ('co2', 'gdp', 10), {}),
+    ]
+
+
+def time_compute(snapshot, name, args, kwargs, repeat, backend=None):
+    """Median time of a first call (cache cleared) and of the memoized call after it, in ms"""
+    func = getattr(compute, name)
+    if backend is not None:
+        kwargs = dict(kwargs, backend=backend)
+    cold, memoized = [], []
+    for _ in range(repeat):
+        func.cache_clear()
+        for timings in (cold, memoized):
+            start = time.perf_counter()
+            func(snapshot, *args, **kwargs)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(cold) * 1000, statistics.median(memoized) * 1000
+
+
+def main():
+    """Compare the pandas and DuckDB query backends on scaled synthetic data, directly and through `compute`"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the dashboard query backends and compute functions on synthetic data",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python deployment/benchmark_queries.py
+  python deployment/benchmark_queries.py --countries 200 2000 20000 --years 100
+  python deployment/benchmark_queries.py --repeat 10 --workdir /tmp/bench
+        """
+    )
+    parser.add_argument(
+        '--countries',
+        type=int,
+        nargs='+',
+        default=[200, 2000, 10000],
+        help='Numbers of countries to benchmark (default: 200 2000 10000)'
+    )
+    parser.add_argument(
+        '--years',
+        type=int,
+        default=70,
+        help='Number of years per country (default: 70)'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Runs per query, the median is reported (default: 5)'
+    )
+    parser.add_argument(
+        '--workdir',
+        default=None,
+        help='Directory for the Parquet files (default: a temporary directory)'
+    )
+    args = parser.parse_args()
+
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        print("❌ Error: duckdb is not installed")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        workdir = args.workdir or temp_dir
+        os.makedirs(workdir, exist_ok=True)
+
+        for n_countries in args.countries:
+            df = synthetic_data(n_countries, args.years)
+            parquet_path = os.path.join(workdir, f"synthetic-{n_countries}x{args.years}.parquet")
+            write_parquet(df, parquet_path)
+            print(f"\n📊 {n_countries:,} countries × {args.years} years = {len(df):,} rows")
+
+            backends = [PandasBackend(FrameColumnStore(df)), DuckDBBackend(parquet_path)]
+            print(f"{'query':<18}" + ''.join(f"{backend.name + ' [ms]':>16}" for backend in backends) + f"{'speedup':>10}")
+            for name, params in workload(df):
+                timings = [time_query(backend, name, params, args.repeat) for backend in backends]
+                print(f"{name:<18}" + ''.join(f"{t:>16.2f}" for t in timings) + f"{timings[0] / timings[1]:>9.1f}x")
+
+            # The same backends behind the memoized compute layer; the snapshot's indexes are built once up front
+            snapshot = build_snapshot(df, version=f"synthetic-{n_countries}x{args.years}")
+            backends[0] = PandasBackend.from_snapshot(snapshot)
+            print(f"\n{'compute':<22}" + ''.join(f"{backend.name + ' [ms]':>16}" for backend in backends) +
+                  f"{'memoized [ms]':>16}")
+            for name, func_args, kwargs in compute_workload(snapshot):
+                if 'backend' in inspect.signature(getattr(compute, name)).parameters:
+                    timings = [time_compute(snapshot, name, func_args, kwargs, args.repeat, backend)
+                               for backend in backends]
+                else:
+                    # Reads the snapshot's arrays, no backend involved
+                    timings = [time_compute(snapshot, name, func_args, kwargs, args.repeat)] + [None]
+                print(f"{name:<22}" + ''.join(f"{'-':>16}" if t is None else f"{t[0]:>16.2f}" for t in timings) +
+                      f"{timings[0][1]:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
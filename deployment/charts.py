@@ -0,0 +1,391 @@
+"""Figure and HTML builders shared by the dashboard and the static export."""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Bottom of the log color scales, log10(0.01)
+LOG_FLOOR = -2.0
+
+# Custom CSS
+STYLE = """
+<style>
+    h1.main-header {
+        color: #3366cc;
+        text-align: left;
+        font-size: 2.5em;
+    }
+    h2.section-header {
+        color: #3366cc;
+        font-size: 1.8em;
+        margin-top: 1em;
+    }
+    h3.subsection-header {
+        font-size: 1.2em;
+        color: #3366cc;
+        margin-top: 0.5em;
+    }
+    p.description-header {
+            font-size: 1.2em;
+            font-weight: bold;
+            color: #333333;
+            margin-top: 0.5em;
+            margin-bottom: 0.5em;}
+    .metric-container {
+        background-color: #f8f8f8;
+        padding: 10px;
+        border-radius: 5px;
+        border-left: 4px solid #000000;
+    }
+</style>
+"""
+
+
+def box_figure(values, metric):
+    """Boxplot of a `value` column"""
+    fig = px.box(values, y="value", labels={'value': metric.column})
+
+    fig.update_layout(
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=16,
+            font_family="Rockwell"
+        )
+    )
+    fig.update_traces(boxpoints='suspectedoutliers') # Only show points that might be outliers
+    return fig
+
+
+def histogram_figure(values, metric):
+    return px.histogram(values, x="value", labels={'value': metric.column})
+
+
+def time_figure(metric, countries, background, line_data, highlighted, min_year, max_year):
+    """Grey line per country (downsampled `background`) with the highlighted countries on top"""
+    fig = go.Figure()
+
+    # Add grey lines for all countries, downsampled to the chart resolution
+    for country, (x, y) in zip(countries, background):
+        if country not in highlighted and len(x) > 0:
+            fig.add_trace(go.Scatter(
+                x=x,
+                y=y,
+                mode='lines',
+                name=country,
+                line=dict(color='gray', width=1),
+                opacity=0.1,
+                showlegend=False
+            ))
+
+    # Add colored lines for selected countries with labels at the end
+    for country, data in line_data.items():
+        if data['highlight'] and data['years']:
+            fig.add_trace(go.Scatter(
+                x=data['years'],
+                y=data[metric.column],
+                mode='lines+markers',
+                name=country,
+                line=dict(color=data['color'], width=3),
+                marker=dict(color=data['color'], size=6)
+            ))
+
+            # Add label at the end of the line as a one-point trace, not a text array of Nones
+            fig.add_trace(go.Scatter(
+                x=data['years'][-1:],
+                y=data[metric.column][-1:],
+                mode='text',
+                name=country,
+                text=[country],
+                textposition='middle right',
+                textfont=dict(color=data['color']),
+                hoverinfo='skip',
+                showlegend=False
+            ))
+
+    # Set x-axis range to start from the first year in the dataset
+    fig.update_layout(
+        xaxis_title="Year",
+        yaxis_title=metric.axis_title,
+        showlegend=False,
+        height=500,
+        margin=dict(l=40, r=40, t=50, b=40),
+        xaxis=dict(range=[min_year-0.2, max_year + 5])  # Add some padding to the right for labels
+    )
+    return fig
+
+
+def slope_figure(metric, items, start_year, end_year):
+    """Slopegraph of `compute.slope_data` items, highlighted countries in color"""
+    fig = go.Figure()
+
+    # Add grey lines for non-selected countries
+    for item in items:
+        if not item['highlight']:
+            fig.add_trace(go.Scatter(
+                x=[0, 1],
+                y=[item['start_val'], item['end_val']],
+                mode='lines',
+                name=item['country'],
+                line=dict(color='gray', width=1),
+                opacity=0.1,
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+
+    # Add colored lines for selected countries
+    for item in items:
+        if item['highlight']:
+            fig.add_trace(go.Scatter(
+                x=[0, 1],
+                y=[item['start_val'], item['end_val']],
+                mode='lines+markers+text',
+                name=item['country'],
+                line=dict(color=item['color'], width=3),
+                marker=dict(color=item['color'], size=10),
+                text=[item['country'], item['country']],
+                textposition=['middle left', 'middle right'],
+                hovertemplate=f"{item['country']}<br>" +
+                              f"Start: {item['start_val']:.2f}<br>" +
+                              f"End: {item['end_val']:.2f}<br>" +
+                              f"Change: {item['abs_change']:.2f} ({item['pct_change']:.1f}%)"
+            ))
+
+    fig.update_layout(
+        title=f"{metric.title} Change from {start_year} to {end_year}",
+        yaxis_type="log" if metric.log_scale else "linear",
+        yaxis_title=metric.axis_title,
+        xaxis=dict(
+            tickmode='array',
+            tickvals=[0, 1],
+            ticktext=[str(start_year), str(end_year)],
+            range=[-0.2, 1.2]
+        ),
+        height=500,
+        margin=dict(l=40, r=40, t=50, b=40),
+        showlegend=False
+    )
+    return fig
+
+
+def change_note(kind, metric, item, start_year, end_year):
+    """HTML box describing the largest increase or decrease"""
+    return f"""
+        <div class='metric-container'>
+        <p class='description-header'>Largest {metric.label} {kind} from {start_year} to {end_year}:<p>
+        <p><b>{item['country']}</b>: {item['start_val']:.2f} to {item['end_val']:.2f} {metric.units}<br>
+        Change: {'+' if item['abs_change'] > 0 else ''}{item['abs_change']:.2f} ({'+' if item['pct_change'] > 0 else ''}{item['pct_change']:.1f}%)</p>
+        </div>
+        """
+
+
+def movers_table(movers, start_year, end_year):
+    """Top movers with one column per year; the sliders allow equal years, which then get distinct labels"""
+    start_label, end_label = str(start_year), str(end_year)
+    if start_label == end_label:
+        start_label, end_label = f"{start_year} (start)", f"{end_year} (end)"
+    return pd.DataFrame(movers, columns=['country', 'start_val', 'end_val', 'abs_change', 'pct_change']).rename(columns={
+        'country': 'Country',
+        'start_val': start_label,
+        'end_val': end_label,
+        'abs_change': 'Change',
+        'pct_change': 'Change (%)'
+    })
+
+
+def extremes_table(extremes, metric):
+    """Rows with the minimum and maximum of a metric, labelled in a leading `type` column"""
+    extremes = extremes.copy()
+    extremes['type'] = [f'Minimum {metric.label}', f'Maximum {metric.label}']
+    return extremes[['type'] + [c for c in extremes.columns if c != 'type']]
+
+
+def scatter_figure(year_data, x, y, region_colors):
+    """One point per country of a year, colored by region; only the y axis follows the metric's log scale"""
+    fig = px.scatter(
+        year_data,
+        x=x.column,
+        y=y.column,
+        color="region",
+        hover_name="country",
+        log_y=y.log_scale,
+        size=[15] * len(year_data),  # Set uniform size for all points (increased)
+        size_max=15,  # Increase maximum size
+        height=600,
+        color_discrete_map=region_colors,  # Use consistent colors
+        labels={y.column: y.axis_title,
+                x.column: x.axis_title,
+                "region": "Region"}
+    )
+
+    fig.update_layout(
+        legend=dict(
+            title="Region",
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="center",
+            x=0.5
+        )
+    )
+    return fig
+
+
+def choropleth_figure(world, values, metric):
+    """Map of one metric in one year (`compute.year_values`), log colored for log-scale metrics"""
+    metric_name = metric.title
+
+    # Merge GeoJSON with data
+    gdf = world.copy()
+    gdf['value'] = gdf['country'].map(values['value']).fillna(0)
+
+    if metric.log_scale:
+        # Log values from load time; missing and non-positive values sit at the bottom of the scale
+        min_color_val = LOG_FLOOR
+        gdf['color_value'] = gdf['country'].map(values['log10']).fillna(LOG_FLOOR).clip(lower=LOG_FLOOR)
+
+        # Get color scale range
+        max_color_val = np.fmax(values['log10'].max(), np.log10(0.02))
+
+        # Create tick values in log space but display as original values
+        tick_exponents = range(int(LOG_FLOOR), int(np.ceil(max_color_val)) + 1)
+        colorbar = dict(
+            title=f"{metric_name} (Log Scale)",
+            tickvals=list(tick_exponents),
+            ticktext=[f"{10.0 ** k:g}" for k in tick_exponents],
+            len=0.5
+        )
+    else:
+        gdf['color_value'] = gdf['value']
+        min_color_val = min(values['value'].min(), 0)
+        max_color_val = values['value'].max()
+        colorbar = dict(title=metric_name, len=0.5)
+
+    # Choropleth with Plotly
+    fig = px.choropleth(
+        gdf,
+        geojson=gdf.geometry,
+        locations=gdf.index,
+        color='color_value',
+        hover_name='country',
+        color_continuous_scale="Reds",
+        range_color=(min_color_val, max_color_val),
+        labels={'color_value': metric_name},
+    )
+
+    # Custom hover template to show original values, not log values
+    fig.update_traces(
+        hovertemplate='<b>%{hovertext}</b><br>' +
+                     f'{metric_name}: ' + '%{customdata:.2f}<extra></extra>',
+        customdata=gdf['value']
+    )
+
+    fig.update_layout(
+        height=600,
+        margin={"r":0,"t":30,"l":0,"b":0},
+        coloraxis_colorbar=colorbar
+    )
+
+    fig.update_geos(
+        showcoastlines=True,
+        coastlinecolor="Black",
+        showland=True,
+        landcolor="white",
+        showocean=True,
+        oceancolor="lightblue",
+        projection_type="equirectangular",
+        fitbounds="locations",  # Fit to data locations
+        visible=True,
+        showcountries=True,
+        countrycolor="gray",
+        showframe=False,  # Remove frame
+        framewidth=0  # Ensure no frame width
+    )
+    return fig
+
+
+def region_figure(region_df, metric, region_colors, year):
+    """Horizontal bars of `compute.region_averages`, regions ordered by value"""
+    sorted_regions = region_df['region'].tolist()
+
+    # Bar chart with consistent colors from scatter plot
+    fig = px.bar(
+        region_df,
+        x='value',
+        y='region',
+        orientation='h',
+        labels={'value': metric.axis_title, 'region': 'Region'},
+        title=f"Average {metric.title} by Region in {year}",
+        color='region',
+        color_discrete_map=region_colors,  # Use same colors as scatter plot
+        height=400
+    )
+
+    fig.update_layout(
+        showlegend=False,
+        xaxis_title=f"{metric.title} (Average in {metric.units})" if metric.units else f"{metric.title} (Average)",
+        yaxis_title="",
+        yaxis={'categoryorder': 'array', 'categoryarray': sorted_regions}  # Order by descending value
+    )
+    return fig
+
+
+def correlation_figure(correlation_df, x, y, region_colors, rolling_df=None, window=None):
+    """Per-year correlation, optionally with rolling-window lines and their confidence bands"""
+    fig = px.line(
+        correlation_df,
+        x='year',
+        y='correlation',
+        labels={'correlation': 'Pearson Correlation', 'year': 'Year'},
+        title=f"Correlation between {y.title} and {x.title} Over Time",
+        markers=True
+    )
+
+    if rolling_df is not None:
+        fig.update_traces(name="Per Year", showlegend=True)
+
+        for group, group_df in rolling_df.groupby('group', sort=True):
+            color = region_colors.get(group, '#3366cc')
+            band_x = group_df['year'].tolist() + group_df['year'].tolist()[::-1]
+            band_y = group_df['upper'].tolist() + group_df['lower'].tolist()[::-1]
+
+            # 95% confidence band (Fisher z)
+            fig.add_trace(go.Scatter(
+                x=band_x,
+                y=band_y,
+                fill='toself',
+                fillcolor=color,
+                opacity=0.15,
+                line=dict(width=0),
+                hoverinfo='skip',
+                showlegend=False
+            ))
+            fig.add_trace(go.Scatter(
+                x=group_df['year'],
+                y=group_df['correlation'],
+                mode='lines',
+                name=f"{group} ({window}-year window)",
+                line=dict(color=color, width=2, dash='dash'),
+                customdata=group_df[['n', 'lower', 'upper']],
+                hovertemplate='%{x}: %{y:.2f} [%{customdata[1]:.2f}, %{customdata[2]:.2f}], n=%{customdata[0]}<extra>%{fullData.name}</extra>'
+            ))
+
+    fig.update_layout(
+        xaxis_title="Year",
+        yaxis_title="Correlation Coefficient",
+        showlegend=rolling_df is not None,
+        yaxis=dict(
+            range=[-0.1, 1.1],
+            tickvals=[0, 0.2, 0.4, 0.6, 0.8, 1.0]
+        )
+    )
+    return fig
+
+
+def correlation_note(x, y):
+    return f"""
+    This chart shows how the correlation between {y.title} and {x.title} has changed over time.
+    A correlation coefficient close to 1 indicates a strong positive relationship, suggesting that
+    countries with a higher {x.title} tend to have a higher {y.title}.
+    The rolling-window mode pools all country-years within the window (optionally per region) and
+    shows the correlation at the window's last year with a 95% confidence band.
+    """
@@ -0,0 +1,115 @@
+"""Columnar dataset access with lazily loaded indicator columns.
+
+Only the key columns are read when a dataset version is opened. An indicator
+column is read the first time a chart asks for it and then kept for the
+lifetime of the snapshot, so the memory of a dashboard process grows with the
+indicators people actually look at, not with the width of the source.
+"""
+import abc
+import threading
+from collections.abc import Mapping
+
+import pandas as pd
+
+KEY_COLUMNS = ('country', 'region', 'year')
+
+
+class LazyMap(Mapping):
+    """Read-only mapping over known keys that builds each value on first access"""
+
+    def __init__(self, keys, build):
+        self._keys = tuple(keys)
+        self._build = build
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if key not in self._keys:
+            raise KeyError(key)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = self._build(key)
+            return self._values[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def loaded(self):
+        """Keys whose value has been built"""
+        return [key for key in self._keys if key in self._values]
+
+
+class ColumnStore(abc.ABC):
+    """Key columns in memory, every other column read on first use by `_read`"""
+
+    def __init__(self, schema, keys):
+        self.schema = schema  # column -> dtype name, in source order
+        self.keys = keys  # DataFrame of the key columns
+        self._columns = LazyMap([name for name in schema if name not in keys.columns], self._read)
+
+    @property
+    def columns(self):
+        return list(self.schema)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def column(self, name):
+        if name in self.keys.columns:
+            return self.keys[name]
+        return self._columns[name]
+
+    def frame(self, columns=()):
+        """Key columns plus the requested columns, without copying loaded data"""
+        data = {name: self.keys[name] for name in self.keys.columns}
+        for name in columns:
+            data[name] = self.column(name)
+        return pd.DataFrame(data, copy=False)
+
+    def loaded(self):
+        """Non-key columns currently held in memory"""
+        return self._columns.loaded()
+
+    @abc.abstractmethod
+    def _read(self, name):
+        """One non-key column as a Series aligned with `keys`"""
+
+
+class FrameColumnStore(ColumnStore):
+    """Store over a DataFrame that is already in memory, e.g. the sample data"""
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        super().__init__({name: str(dtype) for name, dtype in df.dtypes.items()},
+                         df[[name for name in KEY_COLUMNS if name in df.columns]])
+        self._df = df
+
+    def _read(self, name):
+        return self._df[name]
+
+
+class ParquetColumnStore(ColumnStore):
+    """Store over a Parquet file, each column is read as its own column chunks"""
+
+    def __init__(self, path):
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self._file = pq.ParquetFile(path)
+        schema = self._file.schema_arrow
+        keys = [name for name in KEY_COLUMNS if name in schema.names]
+        super().__init__({field.name: str(field.type) for field in schema},
+                         self._file.read(columns=keys).to_pandas())
+
+    def _read(self, name):
+        return self._file.read(columns=[name]).column(0).to_pandas()
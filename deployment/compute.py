@@ -0,0 +1,183 @@
+"""Dashboard computations as pure functions over an immutable DataSnapshot.
+
+Every function takes the snapshot first and only hashable arguments after it,
+and is memoized per (data version, arguments) with LRU eviction. Functions that
+run named queries also take a `backend`, which then enters the key by name;
+the others read the snapshot's load-time arrays directly.
+The dashboard, the exporters and the benchmarks all call these, e.g.
+
+    slope_data(snapshot, 1990, 2020, highlighted=('China',), metrics=('co2', 'gdp'))
+
+Results are shared between callers and must not be modified.
+"""
+import functools
+import inspect
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from correlation import rolling_correlation
+from lod import downsample_panel
+from queries import PandasBackend
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# 10 distinct colors for highlighted countries, assigned in selection order
+HIGHLIGHT_COLORS = px.colors.qualitative.D3[:10]
+
+
+def memoized(maxsize=128):
+    """Memoize a compute function with a bounded LRU cache.
+
+    Only the snapshot's version enters the key, so the cache never keeps an old
+    snapshot alive. If the function has a `backend` parameter, that keyword selects
+    the query backend it reads through (pandas on the snapshot by default) and is
+    keyed by its name. Concurrent first calls with the same key may both compute;
+    the result is the same.
+    """
+    def decorate(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        counts = {'hits': 0, 'misses': 0}
+        uses_backend = 'backend' in inspect.signature(func).parameters
+
+        @functools.wraps(func)
+        def wrapper(snapshot, *args, **kwargs):
+            backend = kwargs.pop('backend', None) if uses_backend else None
+            key = (snapshot.version, args, tuple(sorted(kwargs.items())))
+            if uses_backend:
+                key += (backend.name if backend is not None else PandasBackend.name,)
+            with lock:
+                if key in cache:
+                    counts['hits'] += 1
+                    cache.move_to_end(key)
+                    return cache[key]
+                counts['misses'] += 1
+            if uses_backend:
+                kwargs['backend'] = backend or PandasBackend.from_snapshot(snapshot)
+            value = func(snapshot, *args, **kwargs)
+            with lock:
+                cache[key] = value
+                cache.move_to_end(key)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+
+        def cache_info():
+            with lock:
+                return CacheInfo(counts['hits'], counts['misses'], maxsize, len(cache))
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                counts.update(hits=0, misses=0)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorate
+
+
+def highlight_color(country, highlighted):
+    """Color of a highlighted country, None for all others"""
+    if country not in highlighted:
+        return None
+    return HIGHLIGHT_COLORS[highlighted.index(country) % len(HIGHLIGHT_COLORS)]
+
+
+@memoized(maxsize=64)
+def line_data(snapshot, highlighted, metrics, backend=None):
+    """Per highlighted country its years, color and one value list per metric"""
+    country_data = {}
+    series = backend.run('country_series', countries=tuple(sorted(highlighted)), metrics=tuple(metrics))
+    for country, country_df in series.groupby('country', sort=True, observed=True):
+        country_data[country] = {
+            'years': country_df['year'].tolist(),
+            'color': highlight_color(country, highlighted),
+            'highlight': country in highlighted
+        }
+        for metric in metrics:
+            country_data[country][metric] = country_df[metric].tolist()
+    return country_data
+
+
+@memoized(maxsize=64)
+def slope_data(snapshot, start_year, end_year, highlighted, metrics):
+    """Per metric one item per country with positive values in both years (valid for a log scale)"""
+    i, j = snapshot.year_pos.get(start_year), snapshot.year_pos.get(end_year)
+    if i is None or j is None:
+        # A year without rows has no country with values in both years
+        return {metric: [] for metric in metrics}
+    countries = np.asarray(snapshot.countries, dtype=object)
+    items = {}
+    for metric in metrics:
+        # Rows selected with the load-time masks, changes computed for all of them at once
+        valid = snapshot.valid[metric]
+        rows = np.flatnonzero(valid[:, i] & valid[:, j])
+        start, end = snapshot.panel[metric][rows, i], snapshot.panel[metric][rows, j]
+        items[metric] = [{
+            'country': country,
+            'start_val': start_val,
+            'end_val': end_val,
+            'pct_change': pct_change,
+            'abs_change': abs_change,
+            'color': highlight_color(country, highlighted) or 'gray',
+            'highlight': country in highlighted
+        } for country, start_val, end_val, pct_change, abs_change in zip(
+            countries[rows], start.tolist(), end.tolist(), ((end - start) / start * 100).tolist(), (end - start).tolist()
+        )]
+    return items
+
+
+@memoized(maxsize=256)
+def change_extremes(snapshot, metric, start_year, end_year):
+    """(largest decrease, largest increase) between two years, (None, None) without data"""
+    return snapshot.changes[metric].extremes(start_year, end_year)
+
+
+@memoized(maxsize=256)
+def top_movers(snapshot, metric, start_year, end_year, k=5, largest=True):
+    """The k countries with the largest percent increase (or decrease) between two years"""
+    return snapshot.changes[metric].top_k(start_year, end_year, k=k, largest=largest)
+
+
+@memoized(maxsize=16)
+def background_series(snapshot, metric, n_points):
+    """Every country's series of one metric downsampled to `n_points`, aligned with `snapshot.countries`"""
+    return downsample_panel(snapshot.years, snapshot.panel[metric], n_points)
+
+
+@memoized(maxsize=128)
+def year_values(snapshot, year, metric):
+    """value, log10 (NaN where not positive): one metric in one year, indexed by country"""
+    pos = snapshot.year_pos.get(year)
+    if pos is None:
+        # A year without rows: every country is missing
+        missing = np.full(len(snapshot.countries), np.nan)
+        return pd.DataFrame({'value': missing, 'log10': missing}, index=pd.Index(snapshot.countries, name='country'))
+    return pd.DataFrame({
+        'value': snapshot.panel[metric][:, pos],
+        'log10': snapshot.log_panel[metric][:, pos]
+    }, index=pd.Index(snapshot.countries, name='country'))
+
+
+@memoized(maxsize=128)
+def region_averages(snapshot, year, metric, backend=None):
+    """region, value: mean of one metric per region in one year, sorted by ascending value"""
+    means = backend.run('region_means', year=year, metrics=(metric,))
+    return means.rename(columns={metric: 'value'}).sort_values(by='value', ascending=True).reset_index(drop=True)
+
+
+@memoized(maxsize=32)
+def year_correlation(snapshot, x, y, backend=None):
+    """year, correlation: Pearson correlation per year with more than 10 data points"""
+    return backend.run('year_correlation', x=x, y=y)
+
+
+@memoized(maxsize=32)
+def windowed_correlation(snapshot, x, y, window, by=None, backend=None):
+    """Rolling-window correlation with confidence band, see `correlation.rolling_correlation`"""
+    return rolling_correlation(backend.run('metric_pairs', x=x, y=y), snapshot.years, window, by=by, x=x, y=y)
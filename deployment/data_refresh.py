@@ -0,0 +1,315 @@
+"""Background refresh of the CO2/GDP dataset with atomic hot-swap of the in-memory snapshot."""
+import glob
+import hashlib
+import functools
+import io
+import itertools
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import geopandas as gpd
+import pandas as pd
+import plotly.express as px
+import requests
+
+from column_store import ColumnStore, FrameColumnStore, LazyMap, ParquetColumnStore
+from metrics import DEFAULT_METRICS, available_metrics
+from queries import parquet_in_use, write_parquet
+from rankings import ChangeIndex
+from similarity import TrajectoryIndex
+from validation import DataQuality, log_panel, positive_mask, validate_frame
+
+logger = logging.getLogger(__name__)
+
+KEEP_VERSIONS = 2
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """Immutable dataset version: the columnar data plus the indexes derived from it.
+
+    The per-metric indexes are built on first access, so only the indicators
+    someone looks at are read and indexed.
+    """
+    data: ColumnStore
+    version: str
+    source_tag: str
+    refreshed_at: datetime
+    countries: list
+    years: list
+    regions: list
+    region_colors: dict
+    metrics: tuple  # registry metrics present in the data
+    panel: LazyMap  # metric -> dense (country x year) float array, NaN where missing
+    valid: LazyMap  # metric -> (country x year) bool mask, True where the value is finite and > 0
+    log_panel: LazyMap  # metric -> log10 of the panel, NaN where not valid
+    changes: LazyMap  # metric -> ChangeIndex over all year pairs
+    trajectories: TrajectoryIndex  # normalized paths of the default metrics for similarity search
+    region_means: LazyMap  # metric -> (region x year) means, 0 where a region has no rows
+    year_correlation: LazyMap  # (x, y) metric pair -> Pearson correlation per year, NaN with 10 rows or fewer
+    quality: DataQuality = None  # load-time validation result, None for unvalidated data
+
+    @property
+    def min_year(self):
+        return self.years[0]
+
+    @property
+    def max_year(self):
+        return self.years[-1]
+
+    @functools.cached_property
+    def year_pos(self):
+        """year -> column of the panels; years without rows are absent"""
+        return {year: i for i, year in enumerate(self.years)}
+
+
+def build_panel(df, countries, years, metrics=DEFAULT_METRICS):
+    """Pivot the long frame into one dense country x year matrix per metric"""
+    panel = {}
+    for metric in metrics:
+        wide = df.groupby(['country', 'year'])[metric].first().unstack('year')
+        panel[metric] = wide.reindex(index=countries, columns=years).to_numpy(dtype=float)
+    return panel
+
+
+def build_region_means(df, regions, years, metrics=DEFAULT_METRICS):
+    """Mean of each metric per region and year"""
+    rows = df.groupby(['region', 'year']).size().unstack('year').reindex(index=regions, columns=years)
+    means = {}
+    for metric in metrics:
+        wide = df.groupby(['region', 'year'])[metric].mean().unstack('year').reindex(index=regions, columns=years)
+        means[metric] = wide.where(rows.notna(), 0).to_numpy(dtype=float)
+    return means
+
+
+def build_year_correlation(df, years, x='co2', y='gdp', min_rows=11):
+    """Pearson correlation of two metrics per year, only for years with enough data points"""
+    by_year = df.groupby('year')
+    corr = by_year.apply(lambda year_df: year_df[x].corr(year_df[y]), include_groups=False)
+    corr = corr.where(by_year.size() >= min_rows)
+    return corr.reindex(years).to_numpy(dtype=float)
+
+
+def metric_pairs(metrics):
+    """Unordered metric pairs in registry order, the keys of `DataSnapshot.year_correlation`"""
+    return list(itertools.combinations(metrics, 2))
+
+
+def build_snapshot(data, version, source_tag='', warm=DEFAULT_METRICS, quality=None):
+    """Build a snapshot over a ColumnStore (or a DataFrame); runs off the request path.
+
+    Only the key columns are needed up front. The indexes of the `warm` metrics
+    are built right away so the first rerun does not pay for them, all other
+    metrics are indexed when first shown. A DataFrame is validated here, a
+    ColumnStore is expected to hold validated data described by `quality`.
+    """
+    if isinstance(data, pd.DataFrame):
+        df, quality = validate_frame(data)
+        data = FrameColumnStore(df)
+    keys = data.keys
+    countries = sorted(keys['country'].unique().tolist())
+    years = sorted(keys['year'].unique().tolist())
+    regions = sorted(keys['region'].unique().tolist())
+    metrics = available_metrics(data.columns)
+
+    # Region colors consistent across scatter and bar charts
+    palette = px.colors.qualitative.Plotly
+    region_colors = {region: palette[i % len(palette)] for i, region in enumerate(regions)}
+
+    panel = LazyMap(metrics, lambda metric: build_panel(data.frame([metric]), countries, years, [metric])[metric])
+    valid = LazyMap(metrics, lambda metric: positive_mask(panel[metric]))
+    logs = LazyMap(metrics, lambda metric: log_panel(panel[metric], valid[metric]))
+    trajectory_metrics = [metric for metric in DEFAULT_METRICS if metric in metrics] or list(metrics[:2])
+
+    snapshot = DataSnapshot(
+        data=data,
+        version=version,
+        source_tag=source_tag,
+        refreshed_at=datetime.now(timezone.utc),
+        countries=countries,
+        years=years,
+        regions=regions,
+        region_colors=region_colors,
+        metrics=metrics,
+        panel=panel,
+        valid=valid,
+        log_panel=logs,
+        changes=LazyMap(metrics, lambda metric: ChangeIndex(countries, years, panel[metric], valid=valid[metric])),
+        trajectories=TrajectoryIndex(countries, years, logs, metrics=trajectory_metrics),
+        region_means=LazyMap(
+            metrics, lambda metric: build_region_means(data.frame([metric]), regions, years, [metric])[metric]
+        ),
+        year_correlation=LazyMap(
+            metric_pairs(metrics), lambda pair: build_year_correlation(data.frame(pair), years, *pair)
+        ),
+        quality=quality,
+    )
+    warm = [metric for metric in warm if metric in metrics]
+    for metric in warm:
+        snapshot.changes[metric]
+        snapshot.region_means[metric]
+    for pair in metric_pairs(warm):
+        snapshot.year_correlation[pair]
+    return snapshot
+
+
+def write_columnar(df, directory, version):
+    """Write a downloaded version as Parquet (one file per version) and drop older versions
+    that no open DuckDB backend reads"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"co2gdp-{version}.parquet")
+    if not os.path.exists(path):
+        staging = path + f".{os.getpid()}.tmp"
+        write_parquet(df, staging)
+        os.replace(staging, path)
+
+    # Older versions may still be read by a snapshot pinned to a running rerun
+    older = [p for p in glob.glob(os.path.join(directory, 'co2gdp-*.parquet')) if p != path]
+    older.sort(key=os.path.getmtime, reverse=True)
+    in_use = parquet_in_use()
+    for stale in older[KEEP_VERSIONS - 1:]:
+        if os.path.abspath(stale) in in_use:
+            continue
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    return path
+
+
+def fetch_geo_data(url):
+    """Download the zipped shapefile and load it with a `country` name column"""
+    # Create a temporary directory to store the downloaded and extracted files
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Download the zip file
+        response = requests.get(url)
+
+        if response.status_code != 200:
+            raise Exception(f"Failed to download: Status code {response.status_code}")
+
+        # Save the zip file to the temporary directory
+        zip_path = os.path.join(temp_dir, "geo_data.zip")
+        with open(zip_path, "wb") as f:
+            f.write(response.content)
+
+        # Extract the zip file
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(temp_dir)
+
+        # Find the .shp file in the extracted contents
+        shapefile_path = None
+        for root, dirs, files in os.walk(temp_dir):
+            for file in files:
+                if file.endswith(".shp"):
+                    shapefile_path = os.path.join(root, file)
+                    break
+            if shapefile_path:
+                break
+
+        if not shapefile_path:
+            raise Exception("No .shp file found in the downloaded zip.")
+
+        # Load the shapefile with GeoPandas
+        world = gpd.read_file(shapefile_path)
+
+        # Rename the country column if needed
+        if 'NAME' in world.columns:
+            world = world.rename(columns={'NAME': 'country'})
+        elif 'name' in world.columns:
+            world = world.rename(columns={'name': 'country'})
+
+        return world
+
+
+def remote_tag(url, timeout=10):
+    """Cheap change marker for the source (ETag or Last-Modified), '' if the server sends neither"""
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=timeout)
+    except requests.RequestException:
+        return ''
+    if response.status_code != 200:
+        return ''
+    return response.headers.get('ETag') or response.headers.get('Last-Modified') or ''
+
+
+class DataRefresher:
+    """Polls the dataset source in a daemon thread and swaps in new snapshots atomically.
+
+    Readers call `current()` once per script run and use that snapshot for the whole
+    rerun, so a swap in the middle of a run never mixes two data versions. Replacing
+    the snapshot is a single reference assignment, so readers never block on a reload.
+    """
+
+    def __init__(self, url, interval=600, fallback=None, timeout=60, data_dir=None):
+        self.url = url
+        self.data_dir = data_dir or os.path.join(os.path.expanduser('~'), '.cache', 'co2gdp')
+        self.interval = interval
+        self.fallback = fallback
+        self.timeout = timeout
+        self.last_checked = None
+        self.last_error = None
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self):
+        return self._snapshot
+
+    def refresh(self):
+        """Check the source and swap in a new snapshot if it changed; returns True on swap"""
+        with self._refresh_lock:
+            try:
+                swapped = self._refresh()
+                self.last_error = None
+            except Exception as e:
+                logger.exception("Dataset refresh failed")
+                self.last_error = e
+                swapped = False
+                if self._snapshot is None and self.fallback is not None:
+                    self._snapshot = build_snapshot(self.fallback(), version='sample')
+                    swapped = True
+            self.last_checked = datetime.now(timezone.utc)
+            return swapped
+
+    def _refresh(self):
+        current = self._snapshot
+        tag = remote_tag(self.url)
+        if current is not None and tag and tag == current.source_tag:
+            return False
+
+        response = requests.get(self.url, timeout=self.timeout)
+        if response.status_code != 200:
+            raise Exception(f"Failed to download: Status code {response.status_code}")
+
+        version = hashlib.sha256(response.content).hexdigest()[:12]
+        if current is not None and version == current.version:
+            return False
+
+        # The full frame only lives until it is validated and written out; the snapshot reads columns back on demand
+        df, quality = validate_frame(pd.read_csv(io.BytesIO(response.content)))
+        if quality.duplicates:
+            logger.warning("Dropped %d duplicate (country, year) rows, e.g. %s", quality.duplicates, quality.duplicate_keys[:3])
+        if quality.incomplete:
+            logger.warning("Dropped %d rows without country, region or year", quality.incomplete)
+        path = write_columnar(df, self.data_dir, version)
+        self._snapshot = build_snapshot(ParquetColumnStore(path), version=version, source_tag=tag, quality=quality)
+        logger.info("Swapped in dataset version %s", version)
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='co2gdp-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
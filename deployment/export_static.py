@@ -0,0 +1,341 @@
+"""Export the dashboard as a static HTML site for read-only viewers.
+
+Every section is rendered once per data version into plain HTML files that any
+file server can host. The per-year, per-map and per-slope-pair pages are
+rendered in parallel by a process pool; the workers map the same panel store,
+so the data is held once in the page cache. plotly.js is written once at the
+root of the site and referenced by every page instead of being inlined.
+
+Layout of the output directory:
+
+    index.html              overview, univariate analysis, lines, correlations, links
+    plotly.min.js           shared by all pages
+    year/<year>.html        scatter plots and regional averages of one year
+    map/<metric>/<year>.html  choropleth of one indicator in one year
+    slope/<start>-<end>.html  slopegraphs and top movers between two years
+"""
+import argparse
+import html
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+import charts
+import compute
+from data_refresh import DataRefresher, fetch_geo_data, metric_pairs
+from figure_payload import compact_figure
+from metrics import get_metric
+from panel_store import current_version, load_store, load_store_geo, write_store
+from queries import PandasBackend
+
+PLOTLY_JS = 'plotly.min.js'
+
+# Per-process state of the pool workers, set by `_init_worker`
+_worker = {}
+
+
+def _init_worker(store_path, version, out_dir, chart_width_px):
+    snapshot = load_store(store_path, version)
+    _worker.update(
+        snapshot=snapshot,
+        backend=PandasBackend.from_snapshot(snapshot),
+        world=load_store_geo(store_path),  # rounded by write_store
+        out_dir=out_dir,
+        chart_width_px=chart_width_px,
+    )
+
+
+def figure_html(fig):
+    """Figure as a <div> that uses the shared plotly.js"""
+    compact_figure(fig)
+    return pio.to_html(fig, full_html=False, include_plotlyjs=False, config={'responsive': True})
+
+
+def table_html(df):
+    return df.to_html(index=False, border=0, classes='data-table', float_format=lambda value: f"{value:,.2f}")
+
+
+def page_html(title, body, depth, snapshot):
+    """Complete page, `depth` is the number of directories below the site root"""
+    root = '../' * depth
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<script src="{root}{PLOTLY_JS}"></script>
+{charts.STYLE}
+<style>
+    body {{ font-family: sans-serif; margin: 2em auto; max-width: 1400px; }}
+    .row {{ display: flex; gap: 1em; }}
+    .row > div {{ flex: 1; min-width: 0; }}
+    table.data-table {{ border-collapse: collapse; }}
+    table.data-table td, table.data-table th {{ padding: 4px 8px; border-bottom: 1px solid #dddddd; text-align: right; }}
+</style>
+</head>
+<body>
+<p><a href="{root}index.html">Dashboard</a></p>
+{body}
+<hr>
+<p style="text-align: center;">CO2 Emissions and GDP Dashboard | Data version {snapshot.version} · exported {time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime())}</p>
+</body>
+</html>
+"""
+
+
+def _row(parts):
+    return "<div class='row'>" + ''.join(f"<div>{part}</div>" for part in parts) + "</div>"
+
+
+def _write(relpath, title, body):
+    depth = relpath.count('/')
+    path = os.path.join(_worker['out_dir'], relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    content = page_html(title, body, depth, _worker['snapshot'])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return relpath, len(content.encode('utf-8'))
+
+
+def scatter_pairs(metrics):
+    """(x, y) indicator pairs, oriented like the dashboard's default of GDP on the x axis"""
+    return [(get_metric(b), get_metric(a)) for a, b in metric_pairs(metrics)]
+
+
+def slope_pairs(years, step):
+    """(start, end) year pairs on a grid of every `step` years, always including the full range"""
+    grid = sorted(set(years[::step]) | {years[0], years[-1]})
+    return [(start, end) for i, start in enumerate(grid) for end in grid[i + 1:]]
+
+
+def render_index(links):
+    snapshot, backend = _worker['snapshot'], _worker['backend']
+    metrics = [get_metric(column) for column in snapshot.metrics]
+    overview = backend.run('overview').iloc[0]
+    parts = ["<h1 class='main-header'>Sample Dashboard on the CO2 Emissions Dataset</h1>",
+             "<h2 class='section-header'>Dataset Overview</h2>",
+             table_html(backend.run('schema').rename(columns={'column': 'Column', 'dtype': 'Data Type'})),
+             f"<p>{overview['n_rows']:,} rows · years {overview['year_min']} - {overview['year_max']} · "
+             f"{overview['n_countries']:,} countries</p>"]
+    if snapshot.quality is not None:
+        parts += [f"<h3 class='subsection-header'>Data Quality: {snapshot.quality.headline}</h3>",
+                  table_html(snapshot.quality.summary())]
+
+    for metric in metrics:
+        values = backend.run('metric_values', metric=metric.column)
+        extremes = backend.run('metric_extremes', metric=metric.column, metrics=(metric.column,))
+        parts += [f"<h2 class='section-header'>Univariate Analysis: {metric.label}</h2>",
+                  _row([figure_html(charts.box_figure(values, metric)),
+                        figure_html(charts.histogram_figure(values, metric))]),
+                  f"<h3 class='subsection-header'>{metric.label} Extremes</h3>",
+                  table_html(charts.extremes_table(extremes, metric))]
+
+    titles = ' and '.join(metric.label for metric in metrics)
+    parts.append(f"<h2 class='section-header'>Development of {titles} over Time by Country</h2>")
+    for metric in metrics:
+        background = compute.background_series(snapshot, metric.column, _worker['chart_width_px'])
+        parts.append(figure_html(charts.time_figure(metric, snapshot.countries, background, {}, (),
+                                                    snapshot.min_year, snapshot.max_year)))
+
+    if len(metrics) >= 2:
+        parts.append("<h2 class='section-header'>Correlation Over Time</h2>")
+        for x, y in scatter_pairs(snapshot.metrics):
+            correlation_df = compute.year_correlation(snapshot, x.column, y.column, backend=backend)
+            parts += [figure_html(charts.correlation_figure(correlation_df, x, y, snapshot.region_colors)),
+                      f"<p>{charts.correlation_note(x, y)}</p>"]
+
+    for title, items in links:
+        parts.append(f"<h3 class='subsection-header'>{title}</h3><p>" +
+                     ' · '.join(f"<a href='{href}'>{label}</a>" for href, label in items) + "</p>")
+    return _write('index.html', 'CO2 GDP Dashboard', '\n'.join(parts))
+
+
+def render_year(year):
+    snapshot, backend = _worker['snapshot'], _worker['backend']
+    year_data = backend.run('year_rows', year=year, metrics=snapshot.metrics)
+    parts = [f"<h2 class='section-header'>Indicators by Year: {year}</h2>"]
+    for x, y in scatter_pairs(snapshot.metrics):
+        parts += [f"<h3 class='subsection-header'>{x.title} vs {y.title} by Country in {year}</h3>",
+                  figure_html(charts.scatter_figure(year_data, x, y, snapshot.region_colors))]
+    parts.append(f"<h3 class='subsection-header'>Regional Averages in {year}</h3>")
+    parts.append(_row([
+        figure_html(charts.region_figure(compute.region_averages(snapshot, year, column, backend=backend),
+                                         get_metric(column), snapshot.region_colors, year))
+        for column in snapshot.metrics
+    ]))
+    return _write(f'year/{year}.html', f'Indicators in {year}', '\n'.join(parts))
+
+
+def render_map(column, year):
+    snapshot = _worker['snapshot']
+    metric = get_metric(column)
+    map_values = compute.year_values(snapshot, year, column)
+    body = (f"<h2 class='section-header'>{metric.title} in {year}</h2>" +
+            figure_html(charts.choropleth_figure(_worker['world'], map_values, metric)))
+    return _write(f'map/{column}/{year}.html', f'{metric.title} in {year}', body)
+
+
+def render_slope(start_year, end_year, top_k):
+    snapshot = _worker['snapshot']
+    slope_data = compute.slope_data(snapshot, start_year, end_year, (), snapshot.metrics)
+    columns = []
+    for column in snapshot.metrics:
+        metric = get_metric(column)
+        parts = [figure_html(charts.slope_figure(metric, slope_data[column], start_year, end_year))]
+        decrease, increase = compute.change_extremes(snapshot, column, start_year, end_year)
+        if decrease and increase:
+            parts += [charts.change_note('Increase', metric, increase, start_year, end_year),
+                      charts.change_note('Decrease', metric, decrease, start_year, end_year)]
+        for kind, largest in (('Increases', True), ('Decreases', False)):
+            movers = compute.top_movers(snapshot, column, start_year, end_year, k=top_k, largest=largest)
+            parts += [f"<p class='description-header'>Top {top_k} {metric.label} {kind}</p>",
+                      table_html(charts.movers_table(movers, start_year, end_year))]
+        columns.append('\n'.join(parts))
+    body = f"<h2 class='section-header'>Change from {start_year} to {end_year}</h2>" + _row(columns)
+    return _write(f'slope/{start_year}-{end_year}.html', f'Change from {start_year} to {end_year}', body)
+
+
+def export_site(store_path, out_dir, workers=None, year_step=1, slope_step=10, top_k=10, chart_width_px=1200, maps=True):
+    """Render every page of the active store version into `out_dir`, returns [(relative path, bytes)]"""
+    version = current_version(store_path)
+    snapshot = load_store(store_path, version)
+    has_geo = maps and load_store_geo(store_path) is not None
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, PLOTLY_JS), 'w', encoding='utf-8') as f:
+        f.write(get_plotlyjs())
+
+    years = snapshot.years[::year_step]
+    slopes = slope_pairs(snapshot.years, slope_step)
+    links = [('Indicators by Year', [(f'year/{year}.html', str(year)) for year in years])]
+    if has_geo:
+        links += [(f'Map of {get_metric(column).title}', [(f'map/{column}/{year}.html', str(year)) for year in years])
+                  for column in snapshot.metrics]
+    links.append(('Change between Years', [(f'slope/{s}-{e}.html', f'{s}-{e}') for s, e in slopes]))
+
+    pages = [(render_index, (links,))]
+    pages += [(render_year, (year,)) for year in years]
+    if has_geo:
+        pages += [(render_map, (column, year)) for column in snapshot.metrics for year in years]
+    pages += [(render_slope, (start, end, top_k)) for start, end in slopes]
+
+    written = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(store_path, version, out_dir, chart_width_px)) as pool:
+        futures = [pool.submit(render, *args) for render, args in pages]
+        for i, future in enumerate(as_completed(futures), 1):
+            written.append(future.result())
+            if i % 50 == 0 or i == len(futures):
+                print(f"  {i}/{len(futures)} pages")
+    return sorted(written)
+
+
+def main():
+    """Render the dashboard of the current dataset version to a static HTML site"""
+    parser = argparse.ArgumentParser(
+        description="Export the dashboard as a static HTML site",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python deployment/export_static.py site
+  python deployment/export_static.py site --panel-store /var/lib/co2gdp/store --workers 8
+  python deployment/export_static.py site --year-step 5 --slope-step 20 --no-maps
+
+Serve the result with any file server, e.g. python -m http.server -d site.
+        """
+    )
+    parser.add_argument('out', help='Output directory of the site')
+    parser.add_argument(
+        '--panel-store',
+        default=None,
+        help='Export the active version of this panel store instead of downloading the dataset'
+    )
+    parser.add_argument(
+        '--url',
+        default=os.environ.get('CO2GDP_DATA_URL') or 'https://drive.switch.ch/index.php/s/cxW0xrmQXdGL1VJ/download',
+        help='URL of the CO2/GDP CSV file'
+    )
+    parser.add_argument(
+        '--geo-url',
+        default=os.environ.get('CO2GDP_GEO_URL') or 'https://drive.switch.ch/index.php/s/bfb1TrwoIrXGAfM/download',
+        help='URL of the zipped country shapefile (empty to skip the maps)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Rendering processes (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--year-step',
+        type=int,
+        default=1,
+        help='Render the year and map pages for every N-th year (default: 1)'
+    )
+    parser.add_argument(
+        '--slope-step',
+        type=int,
+        default=10,
+        help='Render slope pages for all pairs of every N-th year (default: 10)'
+    )
+    parser.add_argument(
+        '--top-k',
+        type=int,
+        default=10,
+        help='Countries per top movers table (default: 10)'
+    )
+    parser.add_argument(
+        '--chart-width',
+        type=int,
+        default=int(os.environ.get('CO2GDP_CHART_WIDTH_PX', 1200)),
+        help='Target resolution of the line charts in pixels (default: 1200)'
+    )
+    parser.add_argument('--no-maps', action='store_true', help='Skip the choropleth pages')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    staging = None
+    store_path = args.panel_store
+    if store_path is None:
+        # Workers share the data through a temporary store instead of each parsing the CSV
+        print(f"📥 Loading dataset from: {args.url}")
+        refresher = DataRefresher(args.url)
+        if not refresher.refresh():
+            print(f"❌ Error loading dataset: {refresher.last_error}")
+            sys.exit(1)
+        world = None
+        if args.geo_url and not args.no_maps:
+            print(f"🗺️ Loading geographic data from: {args.geo_url}")
+            try:
+                world = fetch_geo_data(args.geo_url)
+            except Exception as e:
+                print(f"⚠️ Maps not exported: {e}")
+        staging = tempfile.mkdtemp(prefix='co2gdp-export-')
+        store_path = staging
+        write_store(refresher.current(), store_path, world=world)
+
+    try:
+        print(f"🚀 Rendering pages to: {args.out}")
+        written = export_site(store_path, args.out, workers=args.workers, year_step=args.year_step,
+                              slope_step=args.slope_step, top_k=args.top_k, chart_width_px=args.chart_width,
+                              maps=not args.no_maps)
+    finally:
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    sizes = pd.Series(dict(written))
+    shared = os.path.getsize(os.path.join(args.out, PLOTLY_JS))
+    print(f"✅ {len(sizes)} pages in {time.perf_counter() - start:.1f}s: "
+          f"{sizes.sum() / 1e6:,.1f} MB of pages, median {sizes.median() / 1e3:,.0f} KB, "
+          f"plus {shared / 1e6:,.1f} MB of shared plotly.js")
+
+
+if __name__ == "__main__":
+    main()
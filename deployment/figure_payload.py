@@ -0,0 +1,190 @@
+"""Figure post-processing to cut the JSON payload shipped to the browser per chart."""
+import json
+import logging
+from collections import Counter
+
+import numpy as np
+import plotly
+import plotly.io as pio
+
+logger = logging.getLogger(__name__)
+
+# Data array properties that get rounded (and typed-array encoded where Plotly supports it)
+ARRAY_PROPS = ('x', 'y', 'z', 'customdata', 'lat', 'lon')
+
+# Style properties that may be hoisted from the traces into the template trace defaults
+STYLE_PROPS = ('mode', 'line', 'marker', 'opacity', 'showlegend', 'hoverinfo')
+
+# Plotly's built-in defaults, set explicitly on traces that relied on them when a property is hoisted
+BUILTIN_DEFAULTS = {'opacity': 1, 'showlegend': True, 'hoverinfo': 'all'}
+
+# Plotly >= 6 serializes NumPy arrays as base64 typed arrays ({dtype, bdata}) instead of number lists
+TYPED_ARRAYS = int(plotly.__version__.split('.')[0]) >= 6
+
+
+def round_significant(values, digits):
+    """Round a float array to `digits` significant digits, leaving NaN and inf untouched"""
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values) & (values != 0)
+    if not finite.any():
+        return values
+    magnitude = np.floor(np.log10(np.abs(values[finite])))
+    factor = 10.0 ** (digits - 1 - magnitude)
+    rounded = values.copy()
+    rounded[finite] = np.round(values[finite] * factor) / factor
+    return rounded
+
+
+def _compact_array(values, digits):
+    try:
+        array = np.asarray(values)
+    except (ValueError, TypeError):
+        return values
+    if array.dtype.kind in 'iub':
+        return array
+    if array.dtype.kind != 'f':
+        return values
+    rounded = round_significant(array, digits)
+    return rounded.astype(np.float32) if TYPED_ARRAYS and digits <= 7 else rounded
+
+
+def round_geometry(world, decimals=3):
+    """Copy of a GeoDataFrame with coordinates rounded to `decimals` (3 is about 100 m).
+
+    Geometry does not change between reruns, so this runs once when the
+    geometries are loaded instead of on every choropleth figure.
+    """
+    import shapely
+
+    world = world.copy()
+    world.geometry = shapely.transform(world.geometry.values, lambda coords: np.round(coords, decimals))
+    return world
+
+
+def _style_key(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _leaf_paths(value, prefix=()):
+    if isinstance(value, dict):
+        paths = []
+        for key, child in value.items():
+            paths.extend(_leaf_paths(child, prefix + (key,)))
+        return paths
+    return [prefix]
+
+
+def _has_path(value, path):
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return False
+        value = value[key]
+    return True
+
+
+def _hoist_shared_styles(fig, min_traces):
+    """Move style properties shared by most traces of a type into the template trace defaults.
+
+    A property is only hoisted if every other trace of that type sets it (or all of
+    its nested keys) explicitly or its built-in default is known and can be pinned,
+    so the new default never leaks into a trace that relied on Plotly's default.
+    It is also only hoisted if the traces it is removed from save more bytes than
+    the template entry and the pins cost.
+    """
+    template_data = fig.layout.template.data
+    by_type = {}
+    for trace in fig.data:
+        by_type.setdefault(trace.type, []).append(trace)
+
+    for trace_type, traces in by_type.items():
+        defaults = getattr(template_data, trace_type, None)
+        if len(traces) < min_traces or defaults is None or len(defaults) > 1:
+            continue
+
+        specs = [trace.to_plotly_json() for trace in traces]
+        hoisted = {}
+        for prop in STYLE_PROPS:
+            values = [spec.get(prop) for spec in specs]
+            counts = Counter(_style_key(value) for value in values if value is not None)
+            if not counts:
+                continue
+            key, count = counts.most_common(1)[0]
+            if count < min_traces:
+                continue
+            shared = json.loads(key)
+            paths = _leaf_paths(shared)
+            safe = all(
+                _style_key(value) == key
+                or (value is None and prop in BUILTIN_DEFAULTS)
+                or (value is not None and all(_has_path(value, path) for path in paths))
+                for value in values
+            )
+            pins = sum(value is None for value in values)
+            entry = len(prop) + len(key) + 4  # "prop": value,
+            pin = len(prop) + len(_style_key(BUILTIN_DEFAULTS.get(prop))) + 4
+            if safe and count * entry > entry + pins * pin:
+                hoisted[prop] = (key, shared)
+
+        if not hoisted:
+            continue
+
+        default = defaults[0].to_plotly_json() if defaults else {}
+        for prop, (key, shared) in hoisted.items():
+            default[prop] = shared
+            for trace, spec in zip(traces, specs):
+                if _style_key(spec.get(prop)) == key:
+                    trace[prop] = None
+                elif spec.get(prop) is None:
+                    trace[prop] = BUILTIN_DEFAULTS[prop]
+        setattr(template_data, trace_type, [default])
+
+
+def compact_figure(fig, digits=6, min_shared=3):
+    """Shrink a figure's JSON in place: round data arrays, drop empty text arrays and
+    hoist repeated trace styles into the template (geometry is rounded at load, see `round_geometry`)"""
+    for trace in fig.data:
+        for prop in ARRAY_PROPS:
+            if prop in trace and trace[prop] is not None:
+                trace[prop] = _compact_array(trace[prop], digits)
+        if 'text' in trace and trace.text is not None and not isinstance(trace.text, str):
+            if all(item is None for item in trace.text):
+                trace.text = None
+
+    _hoist_shared_styles(fig, min_shared)
+    return fig
+
+
+def payload_bytes(fig):
+    """Size of the JSON spec Streamlit sends to the browser for this figure.
+
+    This serializes the figure a second time, so callers only measure on request.
+    """
+    return len(pio.to_json(fig, validate=False).encode('utf-8'))
+
+
+class PayloadMeter:
+    """Per-rerun byte accounting of chart payloads with a per-chart budget"""
+
+    def __init__(self, default_budget, budgets=None):
+        self.default_budget = default_budget
+        self.budgets = budgets or {}
+        self.charts = []
+
+    def budget(self, name):
+        return self.budgets.get(name, self.default_budget)
+
+    def record(self, name, sent_bytes):
+        budget = self.budget(name)
+        over = budget is not None and sent_bytes > budget
+        if over:
+            logger.warning("Chart %s payload %d bytes exceeds budget of %d bytes", name, sent_bytes, budget)
+        self.charts.append({
+            'chart': name,
+            'sent_bytes': sent_bytes,
+            'budget_bytes': budget,
+            'over_budget': over,
+        })
+
+    @property
+    def total_bytes(self):
+        return sum(chart['sent_bytes'] for chart in self.charts)
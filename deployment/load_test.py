@@ -0,0 +1,419 @@
+"""Load test of one dashboard process with concurrent simulated sessions.
+
+Starts a stand-in HTTP server with synthetic data, launches the dashboard with
+`streamlit run` against it and drives browser-like sessions over the Streamlit
+websocket protocol. Every session loads the page and then scrubs sliders,
+changes the highlighted countries and toggles indicators, waiting for each
+rerun to finish before the next interaction.
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import hashlib
+import http.server
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+from benchmark_queries import synthetic_data
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'co2-gdp-db.py')
+
+WIDGET_TYPES = ('slider', 'multiselect', 'radio', 'selectbox', 'checkbox')
+
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Serves fixed in-memory files with an ETag, like the dataset host"""
+
+    def _send(self, body):
+        path = self.path.split('?')[0]
+        content = self.server.files.get(path)
+        if content is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', hashlib.sha256(content).hexdigest()[:16])
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+
+    def do_GET(self):
+        self._send(body=True)
+
+    def do_HEAD(self):
+        self._send(body=False)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_data_server(files):
+    """Serve `files` (path -> bytes) on a free local port; returns (server, base URL)"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+    server.files = files
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port, env, timeout=120):
+    """Launch the dashboard with `streamlit run` and wait for its health check"""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', SCRIPT,
+         '--server.port', str(port), '--server.headless', 'true',
+         '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false'],
+        env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Dashboard exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise TimeoutError("Dashboard did not become healthy")
+
+
+def rss_bytes(pid):
+    """Resident set size of a process, None where /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class _BlockingWebSocket:
+    """Blocking client on tornado's websocket (a streamlit dependency), one event loop per session thread"""
+
+    def __init__(self, url, timeout):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)  # tornado creates some futures outside a running loop
+        self._conn = self._loop.run_until_complete(self._open(url, timeout))
+
+    @staticmethod
+    async def _open(url, timeout):
+        return await asyncio.wait_for(
+            websocket_connect(url, subprotocols=['streamlit'], max_message_size=1 << 30), timeout
+        )
+
+    def send(self, data):
+        self._loop.run_until_complete(self._conn.write_message(data, binary=True))
+
+    def recv(self, timeout=None):
+        message = self._loop.run_until_complete(asyncio.wait_for(self._conn.read_message(), timeout))
+        if message is None:
+            raise ConnectionError("Dashboard closed the websocket")
+        return message
+
+    def close(self):
+        self._conn.close()
+        self._loop.run_until_complete(asyncio.sleep(0))
+        self._loop.close()
+        asyncio.set_event_loop(None)
+
+
+@contextlib.contextmanager
+def connect(url, timeout=120):
+    ws = _BlockingWebSocket(url, timeout)
+    try:
+        yield ws
+    finally:
+        ws.close()
+
+
+class Session:
+    """One simulated browser tab: widget values in, rerun latencies out"""
+
+    def __init__(self, ws, timeout=120):
+        self.ws = ws
+        self.timeout = timeout
+        self.widgets = {}  # label -> widget proto of the last run
+        self.states = {}  # label -> (WidgetState field, value), everything this session has set
+        self.latencies = []
+        self.errors = 0
+
+    def rerun(self, changes=None):
+        """Apply widget changes, rerun the script and wait until it finished"""
+        self.states.update(changes or {})
+        msg = BackMsg()
+        client_state = msg.rerun_script
+        client_state.query_string = ''
+        for label, (field, value) in self.states.items():
+            widget = self.widgets.get(label)
+            if widget is None:
+                continue
+            state = client_state.widget_states.widgets.add()
+            state.id = widget.id
+            if field.endswith('_array_value'):
+                getattr(state, field).data.extend(value)
+            else:
+                setattr(state, field, value)
+
+        start = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        widgets = {}
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(self.ws.recv(timeout=self.timeout))
+            kind = fwd.WhichOneof('type')
+            if kind == 'delta' and fwd.delta.WhichOneof('type') == 'new_element':
+                element = fwd.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type in WIDGET_TYPES:
+                    widget = getattr(element, element_type)
+                    widgets[widget.label] = widget
+                elif element_type == 'exception':
+                    self.errors += 1
+            elif kind == 'script_finished':
+                break
+        self.latencies.append(time.perf_counter() - start)
+        self.widgets = widgets
+
+
+# Interaction scripts: each returns the widget changes of consecutive reruns
+
+def scrub_slider(label, widgets, rng):
+    slider = widgets.get(label)
+    if slider is None:
+        return []
+    low, high = int(slider.min), int(slider.max)
+    value = int(rng.integers(low, high + 1))
+    direction = rng.choice([-1, 1])
+    steps = []
+    for _ in range(int(rng.integers(3, 8))):
+        value = int(np.clip(value + direction * rng.integers(1, 4), low, high))
+        steps.append({label: ('double_array_value', [value])})
+    return steps
+
+
+def pick_options(label, widgets, rng, min_count=0, max_count=5):
+    widget = widgets.get(label)
+    if widget is None or not widget.options:
+        return []
+    count = int(rng.integers(min_count, min(max_count, len(widget.options)) + 1))
+    chosen = rng.choice(len(widget.options), size=count, replace=False)
+    return [{label: ('string_array_value', [widget.options[i] for i in sorted(chosen)])}]
+
+
+def pick_option(label, widgets, rng):
+    widget = widgets.get(label)
+    if widget is None or not widget.options:
+        return []
+    return [{label: ('string_value', widget.options[int(rng.integers(len(widget.options)))])}]
+
+
+def toggle(label, widgets, rng):
+    widget = widgets.get(label)
+    if widget is None or widget.disabled:
+        return []
+    return [{label: ('bool_value', bool(rng.integers(2)))}]
+
+
+INTERACTIONS = (
+    functools.partial(scrub_slider, 'Select Year'),
+    functools.partial(scrub_slider, 'Start Year'),
+    functools.partial(scrub_slider, 'End Year'),
+    functools.partial(pick_options, 'Select Countries to Highlight:'),
+    functools.partial(pick_options, 'Indicators', min_count=1),
+    functools.partial(pick_option, 'Select Choropleth Metric:'),
+    functools.partial(toggle, 'Show Rolling-Window Correlation'),
+)
+
+
+def run_session(url, n_interactions, think_time, seed, results, finished, release):
+    rng = np.random.default_rng(seed)
+    session = None
+    failed = 0
+    with contextlib.ExitStack() as stack:
+        try:
+            ws = stack.enter_context(connect(url))
+            session = Session(ws)
+            session.rerun()
+            for _ in range(n_interactions):
+                interaction = INTERACTIONS[int(rng.integers(len(INTERACTIONS)))]
+                for changes in interaction(session.widgets, rng):
+                    session.rerun(changes)
+                    if think_time:
+                        time.sleep(rng.exponential(think_time))
+        except Exception as e:
+            print(f"⚠️ Session {seed} failed: {e}", flush=True)
+            failed = 1
+        if session is not None:
+            results.append((session.latencies, session.errors + failed))
+        else:
+            results.append(([], failed))
+
+        # Stay connected until the memory of this concurrency level has been sampled
+        finished.wait()
+        release.wait()
+
+
+def run_level(url, n_sessions, n_interactions, think_time, pid, seed=0):
+    """Run `n_sessions` concurrent sessions; returns one report row"""
+    results = []
+    finished = threading.Barrier(n_sessions + 1)
+    release = threading.Event()
+    threads = [
+        threading.Thread(target=run_session,
+                         args=(url, n_interactions, think_time, seed * 1000 + i, results, finished, release))
+        for i in range(n_sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    finished.wait()
+    wall = time.perf_counter() - start
+    rss = rss_bytes(pid)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    latencies = np.array([latency for session_latencies, _ in results for latency in session_latencies]) * 1000
+    return {
+        'sessions': n_sessions,
+        'reruns': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'throughput': len(latencies) / wall if wall > 0 else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'rss_bytes': rss,
+    }
+
+
+def _ms(value):
+    return f"{value:>10.0f}" if value is not None else f"{'-':>10}"
+
+
+def main():
+    """Ramp up concurrent sessions against one dashboard process and report latency and memory"""
+    parser = argparse.ArgumentParser(
+        description="Load test one dashboard process with concurrent simulated sessions",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python deployment/load_test.py
+  python deployment/load_test.py --sessions 1 5 10 25 50 --interactions 20
+  python deployment/load_test.py --countries 2000 --think-time 1 --json load.json
+        """
+    )
+    parser.add_argument(
+        '--sessions',
+        type=int,
+        nargs='+',
+        default=[1, 2, 4, 8, 16],
+        help='Concurrency levels to ramp through (default: 1 2 4 8 16)'
+    )
+    parser.add_argument(
+        '--interactions',
+        type=int,
+        default=10,
+        help='Interactions per session after the page load; slider scrubs rerun several times (default: 10)'
+    )
+    parser.add_argument(
+        '--think-time',
+        type=float,
+        default=0.2,
+        help='Mean pause in seconds between reruns of a session, 0 for back-to-back reruns (default: 0.2)'
+    )
+    parser.add_argument(
+        '--countries',
+        type=int,
+        default=200,
+        help='Number of countries in the synthetic dataset (default: 200)'
+    )
+    parser.add_argument(
+        '--years',
+        type=int,
+        default=70,
+        help='Number of years per country (default: 70)'
+    )
+    parser.add_argument(
+        '--geo-file',
+        default=None,
+        help='Zipped country shapefile to serve as geographic data (default: none, no choropleth)'
+    )
+    parser.add_argument(
+        '--json',
+        default=None,
+        help='Also write the report rows to this JSON file'
+    )
+    args = parser.parse_args()
+
+    files = {'/data.csv': synthetic_data(args.countries, args.years).to_csv(index=False).encode('utf-8')}
+    if args.geo_file:
+        with open(args.geo_file, 'rb') as f:
+            files['/geo.zip'] = f.read()
+    data_server, base_url = start_data_server(files)
+    print(f"🌐 Serving {args.countries:,} countries × {args.years} years at {base_url}")
+
+    with tempfile.TemporaryDirectory() as parquet_dir:
+        port = _free_port()
+        app = start_app(port, {
+            'CO2GDP_DATA_URL': f"{base_url}/data.csv",
+            'CO2GDP_GEO_URL': f"{base_url}/geo.zip",
+            'CO2GDP_PARQUET_DIR': parquet_dir,
+            'CO2GDP_PANEL_STORE': '',
+            'CO2GDP_PROFILE': '0',
+        })
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        try:
+            # Warm-up session so the shared caches are filled before the baseline is taken
+            warm_up = run_level(url, 1, 0, 0, app.pid)
+            baseline = rss_bytes(app.pid)
+            print(f"🚀 Dashboard pid {app.pid}, first page load {_ms(warm_up['p50_ms']).strip()} ms"
+                  + (f", {baseline / 2**20:,.0f} MB resident" if baseline else ''))
+
+            print(f"\n{'sessions':>8}{'reruns':>8}{'errors':>8}{'reruns/s':>10}"
+                  f"{'p50 [ms]':>10}{'p95 [ms]':>10}{'p99 [ms]':>10}{'MB/session':>12}")
+            rows = []
+            for level, n_sessions in enumerate(args.sessions, start=1):
+                row = run_level(url, n_sessions, args.interactions, args.think_time, app.pid, seed=level)
+                row['mb_per_session'] = (
+                    (row['rss_bytes'] - baseline) / 2**20 / n_sessions
+                    if row['rss_bytes'] and baseline else None
+                )
+                rows.append(row)
+                per_session = f"{row['mb_per_session']:>12.1f}" if row['mb_per_session'] is not None else f"{'-':>12}"
+                print(f"{row['sessions']:>8}{row['reruns']:>8}{row['errors']:>8}{row['throughput']:>10.1f}"
+                      f"{_ms(row['p50_ms'])}{_ms(row['p95_ms'])}{_ms(row['p99_ms'])}{per_session}")
+        finally:
+            app.terminate()
+            app.wait(timeout=30)
+            data_server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n✅ Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
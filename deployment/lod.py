@@ -0,0 +1,46 @@
+"""Level-of-detail downsampling of long time series for the line charts."""
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling to at most `threshold` points.
+
+    Keeps the first and last point and, per bucket, the point spanning the
+    largest triangle with the previously kept point and the next bucket's mean,
+    which preserves peaks and troughs that plain striding would drop.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    bucket_size = (n - 2) / (threshold - 2)
+    keep = np.empty(threshold, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+
+    return x[keep], y[keep]
+
+
+def downsample_panel(years, values, threshold):
+    """Downsample every row of a dense (country x year) matrix; returns one (x, y) pair per row"""
+    x_all = np.asarray(years, dtype=float)
+    series = []
+    for row in np.asarray(values, dtype=float):
+        finite = np.isfinite(row)
+        series.append(lttb(x_all[finite], row[finite], threshold))
+    return series
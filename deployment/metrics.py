@@ -0,0 +1,46 @@
+"""Registry of the indicator columns the dashboard can show.
+
+Every indicator section of the dashboard is generated from this registry; to
+show another column of the source, declare it here:
+
+    Metric('energy', 'Energy', 'Primary Energy Use', 'kWh per capita')
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Metric:
+    """One indicator column with its labels and axis scale"""
+    column: str
+    label: str  # short name for headings and tables, e.g. 'CO2'
+    title: str  # full name for axes and chart titles
+    units: str
+    log_scale: bool = True
+
+    @property
+    def axis_title(self):
+        return f"{self.title} ({self.units})" if self.units else self.title
+
+
+REGISTRY = (
+    Metric('co2', 'CO2', 'CO2 Emissions', 'metric tons per capita'),
+    Metric('gdp', 'GDP', 'GDP', 'USD per capita'),
+)
+
+# Indicators shown when a session starts and warmed up with every new snapshot
+DEFAULT_METRICS = ('co2', 'gdp')
+
+_BY_COLUMN = {metric.column: metric for metric in REGISTRY}
+
+
+def get_metric(column):
+    try:
+        return _BY_COLUMN[column]
+    except KeyError:
+        raise ValueError(f"Unknown metric: {column}") from None
+
+
+def available_metrics(columns):
+    """Columns of the registry that are present in the data, in registry order"""
+    columns = set(columns)
+    return tuple(metric.column for metric in REGISTRY if metric.column in columns)
@@ -0,0 +1,311 @@
+"""On-disk, memory-mapped store of the dashboard snapshot shared by all worker processes.
+
+A loader writes the dense metric matrices, the country/region code tables and
+the precomputed aggregates once as .npy files; every dashboard process maps them
+read-only, so the OS page cache holds a single copy per host. Each indicator's
+files are only mapped once that indicator is shown.
+
+Layout of the store directory:
+
+    CURRENT              name of the active version directory, replaced atomically
+    <version>/meta.json  code tables, years, region colors, column layout
+    <version>/*.npy      long-form columns, panels, change matrices, aggregates
+    <version>/world.parquet  country geometries (optional)
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from column_store import KEY_COLUMNS, ColumnStore, LazyMap
+from data_refresh import DataRefresher, DataSnapshot, build_year_correlation, fetch_geo_data, metric_pairs
+from figure_payload import round_geometry
+from rankings import ChangeIndex
+from similarity import TrajectoryIndex
+from validation import DataQuality, log_panel, positive_mask
+
+CURRENT = 'CURRENT'
+KEEP_VERSIONS = 2
+# Seconds a replaced version stays on disk: several worker poll intervals plus a rerun
+PRUNE_GRACE = 600
+
+
+def current_version(path):
+    """Name of the active version in the store, None if nothing was written yet"""
+    try:
+        with open(os.path.join(path, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_store(snapshot, path, world=None):
+    """Write a snapshot (and optionally the geometries) as a new version and activate it"""
+    os.makedirs(path, exist_ok=True)
+    target = os.path.join(path, snapshot.version)
+    staging = target + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    def save(name, array):
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+
+    # Long-form columns, one at a time: numeric as-is, text as int32 codes into a table
+    columns = []
+    for column in snapshot.data.columns:
+        values = snapshot.data.column(column)
+        if pd.api.types.is_numeric_dtype(values):
+            save(f"col_{column}", values.to_numpy())
+            columns.append({'name': column, 'kind': 'numeric', 'dtype': snapshot.data.schema[column]})
+        else:
+            codes, categories = pd.factorize(values, sort=True)
+            save(f"col_{column}", codes.astype(np.int32))
+            columns.append({'name': column, 'kind': 'codes', 'dtype': snapshot.data.schema[column],
+                            'categories': categories.tolist()})
+
+    for metric in snapshot.metrics:
+        save(f"panel_{metric}", snapshot.panel[metric])
+        save(f"valid_{metric}", snapshot.valid[metric])
+        save(f"log_{metric}", snapshot.log_panel[metric])
+        save(f"changes_{metric}", snapshot.changes[metric].pct)
+        save(f"region_means_{metric}", snapshot.region_means[metric])
+
+    # Correlations of the pairs built so far, the workers compute any other pair on demand
+    correlation_pairs = snapshot.year_correlation.loaded()
+    save('year_correlation', np.array(
+        [snapshot.year_correlation[pair] for pair in correlation_pairs], dtype=float
+    ).reshape(len(correlation_pairs), len(snapshot.years)))
+    save('trajectories', snapshot.trajectories.vectors)
+
+    meta = {
+        'version': snapshot.version,
+        'source_tag': snapshot.source_tag,
+        'refreshed_at': snapshot.refreshed_at.isoformat(),
+        'countries': snapshot.countries,
+        'years': [int(year) for year in snapshot.years],
+        'regions': snapshot.regions,
+        'region_colors': snapshot.region_colors,
+        'metrics': list(snapshot.metrics),
+        'columns': columns,
+        'correlation_pairs': [list(pair) for pair in correlation_pairs],
+        'quality': snapshot.quality.to_dict() if snapshot.quality is not None else None,
+        'trajectories': {
+            'countries': snapshot.trajectories.countries,
+            'metrics': list(snapshot.trajectories.metrics),
+            'length': snapshot.trajectories.length,
+        },
+    }
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    if world is not None:
+        round_geometry(world).to_parquet(os.path.join(staging, 'world.parquet'))
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(staging, target)
+
+    # Switch readers over with an atomic rename of the pointer file
+    pointer = os.path.join(path, CURRENT + '.tmp')
+    with open(pointer, 'w') as f:
+        f.write(snapshot.version)
+    os.replace(pointer, os.path.join(path, CURRENT))
+
+    _prune(path, keep=snapshot.version)
+
+
+def _prune(path, keep, grace=PRUNE_GRACE):
+    """Remove versions beyond the newest ones once they were replaced more than `grace` seconds ago.
+
+    Workers map a version's files on first use and only switch at their next poll,
+    so a replaced version stays on disk until every worker has moved on.
+    """
+    versions = [entry for entry in os.scandir(path) if entry.is_dir() and not entry.name.endswith('.tmp')]
+    versions.sort(key=lambda entry: (entry.name != keep, -entry.stat().st_mtime))
+    now = time.time()
+    # A version was replaced when the next newer one was written
+    for newer, entry in zip(versions[KEEP_VERSIONS - 1:], versions[KEEP_VERSIONS:]):
+        if now - newer.stat().st_mtime > grace:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class NpyColumnStore(ColumnStore):
+    """Store over the `col_*.npy` files of one version, each column is mapped on first use"""
+
+    def __init__(self, directory, columns):
+        self.directory = directory
+        self._layout = {column['name']: column for column in columns}
+        keys = pd.DataFrame({
+            name: self._read(name) for name in KEY_COLUMNS if name in self._layout
+        }, copy=False)
+        super().__init__({column['name']: column.get('dtype', column['kind']) for column in columns}, keys)
+
+    def _read(self, name):
+        column = self._layout[name]
+        values = np.load(os.path.join(self.directory, f"col_{name}.npy"), mmap_mode='r')
+        if column['kind'] == 'codes':
+            values = pd.Categorical.from_codes(values, categories=column['categories'])
+        return pd.Series(values, name=name, copy=False)
+
+
+def load_store(path, version=None):
+    """Map the active (or given) version read-only and wrap it in a DataSnapshot"""
+    version = version or current_version(path)
+    if version is None:
+        raise FileNotFoundError(f"No panel store found in {path}")
+    directory = os.path.join(path, version)
+
+    def load(name):
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+
+    def load_or_build(name, build):
+        # Stores written before validation have no masks and log panels
+        if os.path.exists(os.path.join(directory, f"{name}.npy")):
+            return load(name)
+        return build()
+
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+
+    data = NpyColumnStore(directory, meta['columns'])
+    countries, years, metrics = meta['countries'], meta['years'], tuple(meta['metrics'])
+    panel = LazyMap(metrics, lambda metric: load(f"panel_{metric}"))
+    valid = LazyMap(metrics, lambda metric: load_or_build(f"valid_{metric}", lambda: positive_mask(panel[metric])))
+    trajectories = meta['trajectories']
+
+    stored_correlations = load('year_correlation')
+    stored_pairs = {tuple(pair): i for i, pair in enumerate(meta.get('correlation_pairs', []))}
+
+    def year_correlation(pair):
+        if pair in stored_pairs:
+            return stored_correlations[stored_pairs[pair]]
+        return build_year_correlation(data.frame(pair), years, *pair)
+
+    return DataSnapshot(
+        data=data,
+        version=meta['version'],
+        source_tag=meta['source_tag'],
+        refreshed_at=datetime.fromisoformat(meta['refreshed_at']),
+        countries=countries,
+        years=years,
+        regions=meta['regions'],
+        region_colors=meta['region_colors'],
+        metrics=metrics,
+        panel=panel,
+        valid=valid,
+        log_panel=LazyMap(metrics, lambda metric: load_or_build(
+            f"log_{metric}", lambda: log_panel(panel[metric], valid[metric])
+        )),
+        changes=LazyMap(
+            metrics, lambda metric: ChangeIndex(countries, years, panel[metric], pct=load(f"changes_{metric}"))
+        ),
+        trajectories=TrajectoryIndex.from_vectors(
+            trajectories['countries'], load('trajectories'),
+            metrics=trajectories['metrics'], length=trajectories['length']
+        ),
+        region_means=LazyMap(metrics, lambda metric: load(f"region_means_{metric}")),
+        year_correlation=LazyMap(metric_pairs(metrics), year_correlation),
+        quality=DataQuality.from_dict(meta['quality']) if meta.get('quality') else None,
+    )
+
+
+class StoreRefresher(DataRefresher):
+    """Refresher for dashboard workers: follows the store's CURRENT pointer instead of the source URL"""
+
+    def __init__(self, path, interval=60, fallback=None):
+        super().__init__(url=None, interval=interval, fallback=fallback)
+        self.path = path
+
+    def _refresh(self):
+        version = current_version(self.path)
+        if version is None:
+            raise FileNotFoundError(f"No panel store found in {self.path}")
+        current = self._snapshot
+        if current is not None and current.version == version:
+            return False
+        self._snapshot = load_store(self.path, version)
+        return True
+
+
+def load_store_geo(path):
+    """Country geometries from the active version, None if the loader stored none"""
+    version = current_version(path)
+    geo_path = os.path.join(path, version, 'world.parquet') if version else None
+    if geo_path is None or not os.path.exists(geo_path):
+        return None
+    return gpd.read_parquet(geo_path)
+
+
+def main():
+    """Download the dataset, build the snapshot and write it to the panel store"""
+    parser = argparse.ArgumentParser(
+        description="Build the memory-mapped panel store shared by the dashboard workers",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python deployment/panel_store.py /var/lib/co2gdp/store
+  python deployment/panel_store.py /var/lib/co2gdp/store --watch 600
+
+Point the dashboard workers to the store with CO2GDP_PANEL_STORE=/var/lib/co2gdp/store.
+        """
+    )
+    parser.add_argument('path', help='Directory of the panel store')
+    parser.add_argument(
+        '--url',
+        default='https://drive.switch.ch/index.php/s/cxW0xrmQXdGL1VJ/download',
+        help='URL of the CO2/GDP CSV file'
+    )
+    parser.add_argument(
+        '--geo-url',
+        default='https://drive.switch.ch/index.php/s/bfb1TrwoIrXGAfM/download',
+        help='URL of the zipped country shapefile (empty to skip)'
+    )
+    parser.add_argument(
+        '--watch',
+        type=int,
+        default=0,
+        help='Keep polling the source every N seconds and write new versions (default: run once)'
+    )
+    args = parser.parse_args()
+
+    world = None
+    if args.geo_url:
+        print(f"🗺️ Loading geographic data from: {args.geo_url}")
+        try:
+            world = fetch_geo_data(args.geo_url)
+        except Exception as e:
+            print(f"⚠️ Geographic data not stored: {e}")
+
+    refresher = DataRefresher(args.url)
+    while True:
+        print(f"📥 Checking dataset at: {args.url}")
+        if refresher.refresh():
+            snapshot = refresher.current()
+            if current_version(args.path) == snapshot.version:
+                print(f"✅ Store already holds version {snapshot.version}")
+            else:
+                write_store(snapshot, args.path, world=world)
+                print(f"✅ Stored version {snapshot.version}: {len(snapshot.countries)} countries × {len(snapshot.years)} years")
+                if snapshot.quality is not None and snapshot.quality.duplicates:
+                    print(f"⚠️ Dropped {snapshot.quality.duplicates} duplicate (country, year) rows")
+                if snapshot.quality is not None and snapshot.quality.incomplete:
+                    print(f"⚠️ Dropped {snapshot.quality.incomplete} rows without country, region or year")
+        elif refresher.last_error is not None:
+            print(f"❌ Error loading dataset: {refresher.last_error}")
+            if not args.watch:
+                sys.exit(1)
+        else:
+            print("✅ Dataset unchanged")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""On-demand profiling of full dashboard reruns, kept in a bounded in-memory ring buffer."""
+import cProfile
+import hmac
+import io
+import itertools
+import json
+import marshal
+import os
+import pstats
+import runpy
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+# cProfile hooks are process-wide (sys.monitoring), so only one rerun is profiled at a time
+_profiler_lock = threading.Lock()
+_local = threading.local()
+
+
+@dataclass(frozen=True)
+class RerunProfile:
+    """Profile of one script rerun together with the widget state that triggered it"""
+    id: int
+    started_at: datetime
+    duration: float
+    widget_state: dict
+    stats: bytes  # marshalled pstats data, the format of pstats.Stats.dump_stats
+
+    @property
+    def filename(self):
+        return f"rerun-{self.started_at:%Y%m%d-%H%M%S}-{self.id}.prof"
+
+    def summary(self, limit=15, sort='cumulative'):
+        """Top functions as pstats text, for a quick look without downloading"""
+        stream = io.StringIO()
+        stats = pstats.Stats(_StatsSource(self.stats), stream=stream)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def state_json(self):
+        return json.dumps({
+            'id': self.id,
+            'started_at': self.started_at.isoformat(),
+            'duration_s': self.duration,
+            'widget_state': self.widget_state,
+        }, indent=2, default=str)
+
+
+class _StatsSource:
+    """Minimal profiler stand-in so pstats.Stats can load marshalled stats from memory"""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+class ProfileStore:
+    """Thread-safe ring buffer of the last `size` rerun profiles"""
+
+    def __init__(self, size=20):
+        self._profiles = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def add(self, started_at, duration, widget_state, stats):
+        profile = RerunProfile(next(self._ids), started_at, duration, widget_state, stats)
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def profiles(self):
+        """Newest first"""
+        with self._lock:
+            return list(reversed(self._profiles))
+
+
+def profiling_requested(query_params):
+    """True if every rerun is profiled (CO2GDP_PROFILE=1) or the `profile` query
+    parameter matches the CO2GDP_PROFILE_TOKEN of authorised users"""
+    if os.environ.get('CO2GDP_PROFILE') == '1':
+        return True
+    token = os.environ.get('CO2GDP_PROFILE_TOKEN')
+    supplied = query_params.get('profile')
+    return bool(token) and supplied is not None and hmac.compare_digest(str(supplied), token)
+
+
+def in_profiled_run():
+    return getattr(_local, 'active', False)
+
+
+def run_profiled(script_path, store, widget_state):
+    """Execute the whole script under cProfile and store the result.
+
+    Returns False without running anything if another rerun is being profiled;
+    the caller then simply continues its own, unprofiled run. Exceptions from
+    the script (including Streamlit's stop/rerun signals) propagate after the
+    profile is stored.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        return False
+
+    profiler = cProfile.Profile()
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    _local.active = True
+    try:
+        profiler.enable()
+        try:
+            runpy.run_path(script_path, run_name='__main__')
+        finally:
+            profiler.disable()
+    finally:
+        _local.active = False
+        _profiler_lock.release()
+        profiler.create_stats()
+        store.add(started_at, time.perf_counter() - start, widget_state, marshal.dumps(profiler.stats))
+    return True
@@ -0,0 +1,294 @@
+"""Named, parameterized dashboard queries with a pandas and a DuckDB-on-Parquet backend.
+
+Both backends answer the same queries with the same result columns, so the
+dashboard only names what it needs and the backend decides how to get it:
+
+    backend.run('year_rows', year=2000, metrics=('co2', 'gdp'))
+
+The queries cover the row-level reads: filters, series and aggregates. The
+dense (country x year) panels and the indexes built from them (changes,
+downsampled series, trajectories) live on the snapshot and `compute` reads
+them directly. The snapshot holds the key columns and the panels of the
+indicators on screen in memory whatever the backend, so DuckDB saves reading
+the indicator columns per query but does not serve data larger than memory.
+"""
+import os
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from column_store import KEY_COLUMNS
+from metrics import available_metrics
+
+QUERIES = (
+    'schema',            # column, dtype (see `dtype_name`), from metadata only
+    'overview',          # n_rows, year_min, year_max, n_countries
+    'metric_values',     # value of one metric for every row, in any row order
+    'metric_extremes',   # key columns and the given metrics of the min and max row of one metric, ties by country, year
+    'country_series',    # country, year and the given metrics of the given countries, ordered by country and year
+    'year_rows',         # key columns and the given metrics of one year, in any row order
+    'region_means',      # mean of the given metrics per region in one year, 0 for regions without rows
+    'year_correlation',  # Pearson correlation of two metrics per year with more than 10 rows
+    'metric_pairs',      # year, region and two metrics of rows where both metrics are present, in any row order
+)
+
+# DuckDB type names and the text dtypes of pandas and Arrow, mapped to one name per type
+_DTYPE_NAMES = {
+    'bigint': 'int64', 'integer': 'int32', 'smallint': 'int16', 'tinyint': 'int8',
+    'double': 'float64', 'float': 'float32', 'real': 'float32', 'boolean': 'bool',
+    'varchar': 'string', 'str': 'string', 'object': 'string', 'large_string': 'string',
+}
+
+
+def dtype_name(dtype):
+    """Backend-neutral dtype name: NumPy names for numbers and booleans, 'string' for text"""
+    name = str(dtype).lower()
+    if name.startswith('string'):
+        return 'string'
+    return _DTYPE_NAMES.get(name, name)
+
+
+def _ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class QueryBackend:
+    """Dispatches `run(name, **params)` to the backend method of the same name.
+
+    Metrics are the registry columns present in the data. Queries only touch the
+    metric columns they are given, so indicators that are not on screen are never read.
+    """
+
+    name = None
+    metric_columns = ()
+
+    def run(self, name, **params):
+        if name not in QUERIES:
+            raise ValueError(f"Unknown query: {name}")
+        return getattr(self, name)(**params)
+
+    def _check_metric(self, metric):
+        if metric not in self.metric_columns:
+            raise ValueError(f"Unknown metric: {metric}")
+        return metric
+
+    def _check_metrics(self, metrics):
+        return [self._check_metric(metric) for metric in metrics]
+
+
+class PandasBackend(QueryBackend):
+    """In-memory backend on a ColumnStore, using precomputed aggregates where the snapshot has them"""
+
+    name = 'pandas'
+
+    def __init__(self, data, snapshot=None):
+        self.data = data
+        self.snapshot = snapshot
+        self.metric_columns = available_metrics(data.columns)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.data, snapshot=snapshot)
+
+    def schema(self):
+        return pd.DataFrame({
+            'column': list(self.data.schema),
+            'dtype': [dtype_name(dtype) for dtype in self.data.schema.values()]
+        })
+
+    def overview(self):
+        keys = self.data.keys
+        return pd.DataFrame([{
+            'n_rows': len(keys),
+            'year_min': keys['year'].min(),
+            'year_max': keys['year'].max(),
+            'n_countries': keys['country'].nunique()
+        }])
+
+    def metric_values(self, metric):
+        return pd.DataFrame({'value': self.data.column(self._check_metric(metric))})
+
+    def metric_extremes(self, metric, metrics=None):
+        columns = self._check_metrics(metrics or [metric])
+        values = self.data.column(self._check_metric(metric))
+        df = self.data.frame(columns)
+
+        def first(target):
+            # Ties go to the first (country, year), like the ORDER BY in SQL
+            return df.loc[values == target, ['country', 'year']].sort_values(['country', 'year']).index[0]
+
+        return df.loc[[first(values.min()), first(values.max())], list(KEY_COLUMNS) + columns].reset_index(drop=True)
+
+    def country_series(self, countries, metrics):
+        columns = self._check_metrics(metrics)
+        df = self.data.frame(columns)
+        rows = df[df['country'].isin(list(countries))]
+        return rows.sort_values(['country', 'year'])[['country', 'year'] + columns].reset_index(drop=True)
+
+    def year_rows(self, year, metrics):
+        columns = self._check_metrics(metrics)
+        df = self.data.frame(columns)
+        return df[df['year'] == year][list(KEY_COLUMNS) + columns].reset_index(drop=True)
+
+    def region_means(self, year, metrics):
+        columns = self._check_metrics(metrics)
+        if self.snapshot is not None:
+            year_pos = self.snapshot.year_pos.get(year)
+            result = pd.DataFrame({'region': self.snapshot.regions})
+            for metric in columns:
+                # A year without rows has no column in the means, every region averages 0 like in SQL
+                result[metric] = self.snapshot.region_means[metric][:, year_pos] if year_pos is not None else 0.0
+            return result
+        df = self.data.frame(columns)
+        regions = sorted(df['region'].unique())
+        year_df = df[df['year'] == year]
+        means = year_df.groupby('region')[columns].mean().reindex(regions)
+        has_rows = pd.Series(regions, index=regions).isin(year_df['region'])
+        return means.where(has_rows, 0, axis=0).rename_axis('region').reset_index()
+
+    def year_correlation(self, x, y):
+        x, y = self._check_metric(x), self._check_metric(y)
+        if self.snapshot is not None:
+            pair = (x, y) if (x, y) in self.snapshot.year_correlation else (y, x)
+            result = pd.DataFrame({'year': self.snapshot.years, 'correlation': self.snapshot.year_correlation[pair]})
+            return result[result['correlation'].notna()].reset_index(drop=True)
+        by_year = self.data.frame([x, y]).groupby('year')
+        corr = by_year.apply(lambda year_df: year_df[x].corr(year_df[y]), include_groups=False)
+        corr = corr[(by_year.size() > 10) & corr.notna()]
+        return pd.DataFrame({'year': corr.index, 'correlation': corr.to_numpy()})
+
+    def metric_pairs(self, x, y):
+        x, y = self._check_metric(x), self._check_metric(y)
+        df = self.data.frame([x, y])
+        valid = df[x].notna() & df[y].notna()
+        return df.loc[valid, ['year', 'region', x, y]].reset_index(drop=True)
+
+
+# Open DuckDB backends: their Parquet files must outlive version pruning
+_open_backends = weakref.WeakSet()
+
+
+def parquet_in_use():
+    """Absolute paths of the Parquet files an open DuckDB backend still reads"""
+    return {os.path.abspath(backend.parquet_path) for backend in list(_open_backends)}
+
+
+class DuckDBBackend(QueryBackend):
+    """SQL over a Parquet file, each query reads only its projected columns and matching row groups"""
+
+    name = 'duckdb'
+
+    def __init__(self, parquet_path):
+        import duckdb
+
+        self.parquet_path = parquet_path
+        self._con = duckdb.connect()
+        self._con.execute(
+            f"CREATE VIEW data AS SELECT * FROM read_parquet('{parquet_path.replace(chr(39), chr(39) * 2)}')"
+        )
+        self._local = threading.local()
+        self.metric_columns = available_metrics(self.schema()['column'])
+        _open_backends.add(self)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, directory):
+        """Backend over the snapshot's Parquet file, or over a copy written once per data version"""
+        path = getattr(snapshot.data, 'path', None)
+        if path is None:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"co2gdp-{snapshot.version}.parquet")
+            if not os.path.exists(path):
+                staging = path + f".{os.getpid()}.tmp"
+                write_parquet(snapshot.data.frame(snapshot.data.columns), staging)
+                os.replace(staging, path)
+        return cls(path)
+
+    def _sql(self, sql, **params):
+        # One cursor per thread: Streamlit serves sessions from several threads
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self._con.cursor()
+        params = {key: value.item() if isinstance(value, np.generic) else value for key, value in params.items()}
+        return cursor.execute(sql, params).df()
+
+    def schema(self):
+        result = self._sql("DESCRIBE SELECT * FROM data")
+        return pd.DataFrame({'column': result['column_name'], 'dtype': result['column_type'].map(dtype_name)})
+
+    def overview(self):
+        return self._sql("""
+            SELECT count(*) AS n_rows, min(year) AS year_min, max(year) AS year_max,
+                   count(DISTINCT country) AS n_countries
+            FROM data
+        """)
+
+    def metric_values(self, metric):
+        metric = _ident(self._check_metric(metric))
+        return self._sql(f'SELECT {metric} AS value FROM data')
+
+    def metric_extremes(self, metric, metrics=None):
+        columns = ', '.join(['country', 'region', 'year'] + [_ident(m) for m in self._check_metrics(metrics or [metric])])
+        metric = _ident(self._check_metric(metric))
+        return self._sql(f"""
+            (SELECT {columns} FROM data WHERE {metric} IS NOT NULL ORDER BY {metric} ASC, country, year LIMIT 1)
+            UNION ALL
+            (SELECT {columns} FROM data WHERE {metric} IS NOT NULL ORDER BY {metric} DESC, country, year LIMIT 1)
+        """)
+
+    def country_series(self, countries, metrics):
+        columns = ''.join(f", {_ident(metric)}" for metric in self._check_metrics(metrics))
+        return self._sql(f"""
+            SELECT country, year{columns} FROM data
+            WHERE list_contains($countries, country)
+            ORDER BY country, year
+        """, countries=list(countries))
+
+    def year_rows(self, year, metrics):
+        columns = ''.join(f", {_ident(metric)}" for metric in self._check_metrics(metrics))
+        return self._sql(f"SELECT country, region, year{columns} FROM data WHERE year = $year", year=year)
+
+    def region_means(self, year, metrics):
+        columns = ''.join(
+            f", CASE WHEN count(d.year) = 0 THEN 0 ELSE avg(d.{_ident(metric)}) END AS {_ident(metric)}"
+            for metric in self._check_metrics(metrics)
+        )
+        return self._sql(f"""
+            SELECT r.region{columns}
+            FROM (SELECT DISTINCT region FROM data) r
+            LEFT JOIN data d ON d.region = r.region AND d.year = $year
+            GROUP BY r.region
+            ORDER BY r.region
+        """, year=year)
+
+    def year_correlation(self, x, y):
+        x, y = _ident(self._check_metric(x)), _ident(self._check_metric(y))
+        return self._sql(f"""
+            SELECT year, corr({x}, {y}) AS correlation
+            FROM data
+            GROUP BY year
+            HAVING count(*) > 10 AND corr({x}, {y}) IS NOT NULL
+            ORDER BY year
+        """)
+
+    def metric_pairs(self, x, y):
+        x, y = self._check_metric(x), self._check_metric(y)
+        return self._sql(
+            f"SELECT year, region, {_ident(x)}, {_ident(y)} FROM data "
+            f"WHERE {_ident(x)} IS NOT NULL AND {_ident(y)} IS NOT NULL"
+        )
+
+
+def write_parquet(df, path, row_group_size=64_000):
+    """Write rows sorted by year so per-year queries can skip row groups by their min/max statistics"""
+    df.sort_values(['year', 'country'], kind='stable').to_parquet(path, index=False, row_group_size=row_group_size)
+
+
+def make_backend(kind, snapshot, parquet_dir=None):
+    """Backend for the dashboard: 'pandas' (default) or 'duckdb'"""
+    if kind == 'duckdb':
+        return DuckDBBackend.from_snapshot(snapshot, parquet_dir or os.path.join(os.path.expanduser('~'), '.cache', 'co2gdp'))
+    if kind not in (None, '', 'pandas'):
+        raise ValueError(f"Unknown query backend: {kind}")
+    return PandasBackend.from_snapshot(snapshot)
@@ -0,0 +1,77 @@
+"""Precomputed all-pairs change matrices for top-k increase/decrease rankings."""
+import numpy as np
+
+
+class ChangeIndex:
+    """Percentage change of every country for every (start_year, end_year) pair of one metric.
+
+    Changes are stored for pairs with start < end only, one row per pair in a
+    triangular layout, as float32 with NaN where either value is missing or not
+    positive (the same countries the log-scale slopegraphs leave out).
+    """
+
+    def __init__(self, countries, years, values, pct=None, valid=None):
+        self.countries = np.asarray(countries, dtype=object)
+        self.years = list(years)
+        self.values = np.asarray(values, dtype=float)
+        self._year_pos = {year: i for i, year in enumerate(self.years)}
+
+        # Precomputed changes, e.g. memory-mapped from the panel store
+        if pct is not None:
+            self.pct = pct
+            return
+
+        n_years = len(self.years)
+        n_pairs = n_years * (n_years - 1) // 2
+        self.pct = np.full((n_pairs, len(self.countries)), np.nan, dtype=np.float32)
+
+        if valid is None:
+            valid = np.isfinite(self.values) & (self.values > 0)
+        safe = np.where(valid, self.values, np.nan)
+        for i in range(n_years - 1):
+            start = safe[:, i:i + 1]
+            block = (safe[:, i + 1:] - start) / start * 100
+            first = self._pair_row(i, i + 1)
+            self.pct[first:first + n_years - i - 1] = block.T
+
+    def _pair_row(self, i, j):
+        n = len(self.years)
+        return i * n - i * (i + 1) // 2 + (j - i - 1)
+
+    def top_k(self, start_year, end_year, k=5, largest=True):
+        """Top-k movers between two years, sorted by percentage change (largest first or smallest first)"""
+        i, j = self._year_pos.get(start_year), self._year_pos.get(end_year)
+        if i is None or j is None or i >= j or k <= 0:
+            return []
+
+        row = self.pct[self._pair_row(i, j)]
+        candidates = np.flatnonzero(~np.isnan(row))
+        if len(candidates) == 0:
+            return []
+
+        # Partial selection: only the k winners get sorted
+        keys = row[candidates] if not largest else -row[candidates]
+        if k < len(candidates):
+            candidates = candidates[np.argpartition(keys, k - 1)[:k]]
+            keys = row[candidates] if not largest else -row[candidates]
+        winners = candidates[np.argsort(keys, kind='stable')]
+
+        result = []
+        for c in winners:
+            start_val, end_val = self.values[c, i], self.values[c, j]
+            result.append({
+                'country': self.countries[c],
+                'start_val': start_val,
+                'end_val': end_val,
+                'pct_change': (end_val - start_val) / start_val * 100,
+                'abs_change': end_val - start_val,
+            })
+        return result
+
+    def extremes(self, start_year, end_year):
+        """Largest decrease and largest increase, or (None, None) without valid pairs"""
+        decrease = self.top_k(start_year, end_year, k=1, largest=False)
+        increase = self.top_k(start_year, end_year, k=1, largest=True)
+        if not decrease or not increase:
+            return None, None
+        return decrease[0], increase[0]
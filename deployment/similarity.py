@@ -0,0 +1,105 @@
+"""Trajectory similarity search over the country CO2/GDP paths."""
+import numpy as np
+
+METHODS = ('cosine', 'dtw')
+
+
+def _resample(years, row, length):
+    """Interpolate the finite points of a log10 series onto `length` evenly spaced years"""
+    finite = np.isfinite(row)
+    if finite.sum() < 2:
+        return None
+    x, y = years[finite], row[finite]
+    grid = np.linspace(x[0], x[-1], length)
+    return np.interp(grid, x, y)
+
+
+def _znorm(series):
+    std = series.std()
+    return (series - series.mean()) / std if std > 0 else series - series.mean()
+
+
+def _dtw(query, candidates, band):
+    """Dynamic time warping distances from `query` to each row of `candidates` within a Sakoe-Chiba band"""
+    m, n = candidates.shape
+    cost = np.full((m, n + 1, n + 1), np.inf)
+    cost[:, 0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(max(1, i - band), min(n, i + band) + 1):
+            d = (query[i - 1] - candidates[:, j - 1]) ** 2
+            cost[:, i, j] = d + np.minimum(np.minimum(cost[:, i - 1, j], cost[:, i, j - 1]), cost[:, i - 1, j - 1])
+    return np.sqrt(cost[:, n, n])
+
+
+class TrajectoryIndex:
+    """Fixed-length, normalized co2/gdp vectors per country, built once per snapshot.
+
+    Each metric's log10 panel (NaN where not positive, see `validation.log_panel`)
+    is resampled to `length` points over the years a country has data for and
+    z-normalized, so the index compares the shape of the path rather than its
+    level. Countries without at least two valid points in every metric are left out.
+    """
+
+    def __init__(self, countries, years, log_panel, metrics=('co2', 'gdp'), length=32):
+        years = np.asarray(years, dtype=float)
+        self.metrics = tuple(metrics)
+        self.length = length
+
+        names, rows = [], []
+        for c, country in enumerate(countries):
+            parts = [_resample(years, log_panel[metric][c], length) for metric in self.metrics]
+            if any(part is None for part in parts):
+                continue
+            names.append(country)
+            rows.append(np.concatenate([_znorm(part) for part in parts]))
+
+        self._set_vectors(names, np.array(rows, dtype=np.float32).reshape(len(rows), len(self.metrics) * length))
+
+    @classmethod
+    def from_vectors(cls, countries, vectors, metrics=('co2', 'gdp'), length=32):
+        """Wrap already normalized vectors, e.g. memory-mapped from the panel store"""
+        index = cls.__new__(cls)
+        index.metrics = tuple(metrics)
+        index.length = length
+        index._set_vectors(list(countries), vectors)
+        return index
+
+    def _set_vectors(self, countries, vectors):
+        self.countries = countries
+        self._pos = {country: i for i, country in enumerate(countries)}
+        self.vectors = vectors
+
+        # Unit-length copies for cosine similarity as a single matrix-vector product
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.unit = np.divide(vectors, norms, out=np.zeros(vectors.shape, dtype=np.float32), where=norms > 0)
+
+    def __contains__(self, country):
+        return country in self._pos
+
+    def query(self, country, k=5, method='cosine', candidates=50, band=3):
+        """Return [(country, score)] of the k most similar trajectories.
+
+        `cosine` ranks by cosine similarity (higher is closer). `dtw` reranks the
+        best cosine `candidates` by banded DTW distance per metric (lower is closer).
+        """
+        if country not in self._pos or k <= 0:
+            return []
+        q = self._pos[country]
+
+        similarity = self.unit @ self.unit[q]
+        similarity[q] = -np.inf
+        n_pick = min(k if method == 'cosine' else max(k, candidates), len(similarity) - 1)
+        if n_pick <= 0:
+            return []
+        picked = np.argpartition(-similarity, n_pick - 1)[:n_pick]
+
+        if method == 'cosine':
+            picked = picked[np.argsort(-similarity[picked], kind='stable')]
+            return [(self.countries[i], float(similarity[i])) for i in picked]
+
+        shape = (len(self.metrics), self.length)
+        query_parts = self.vectors[q].reshape(shape)
+        candidate_parts = self.vectors[picked].reshape((len(picked),) + shape)
+        distances = sum(_dtw(query_parts[m], candidate_parts[:, m], band) for m in range(len(self.metrics)))
+        order = np.argsort(distances, kind='stable')[:k]
+        return [(self.countries[picked[i]], float(distances[i])) for i in order]
@@ -0,0 +1,23 @@
+"""Shared synthetic dataset for the deployment tests."""
+import numpy as np
+import pytest
+
+from benchmark_queries import synthetic_data
+from data_refresh import build_snapshot
+
+
+@pytest.fixture(scope='session')
+def frame():
+    """Small CO2/GDP panel with the gaps of the real dataset: missing rows, missing and non-positive values"""
+    df = synthetic_data(40, 30, seed=1)
+    rng = np.random.default_rng(2)
+    df.loc[rng.random(len(df)) < 0.02, 'gdp'] = np.nan
+    df.loc[rng.random(len(df)) < 0.01, 'co2'] = 0.0
+    df.loc[rng.random(len(df)) < 0.01, 'gdp'] = -1.0
+    # Countries without rows in some years
+    return df[rng.random(len(df)) > 0.03].reset_index(drop=True)
+
+
+@pytest.fixture(scope='session')
+def snapshot(frame):
+    return build_snapshot(frame, version='test')
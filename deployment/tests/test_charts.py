@@ -0,0 +1,26 @@
+import pytest
+
+import charts
+import compute
+from metrics import get_metric
+
+
+@pytest.mark.parametrize('years', [(0, -1), (5, 5)])
+def test_movers_table_has_unique_columns(snapshot, years):
+    start_year, end_year = snapshot.years[years[0]], snapshot.years[years[1]]
+    movers = compute.top_movers(snapshot, 'co2', start_year, end_year, k=5)
+    table = charts.movers_table(movers, start_year, end_year)
+
+    assert table.columns.is_unique
+    assert len(table) == (5 if start_year < end_year else 0)
+    if start_year < end_year:
+        assert list(table.columns[1:3]) == [str(start_year), str(end_year)]
+
+
+def test_scatter_keeps_linear_x_axis(snapshot):
+    year_data = snapshot.data.frame(['co2', 'gdp'])
+    year_data = year_data[year_data['year'] == snapshot.max_year]
+    x, y = get_metric('gdp'), get_metric('co2')
+    fig = charts.scatter_figure(year_data, x, y, snapshot.region_colors)
+    assert fig.layout.xaxis.type is None
+    assert fig.layout.yaxis.type == 'log'
@@ -0,0 +1,140 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import compute
+from queries import PandasBackend
+
+
+def counted(maxsize=128):
+    """A memoized function that records every call that reaches it"""
+    calls = []
+
+    @compute.memoized(maxsize=maxsize)
+    def func(snapshot, *args, **kwargs):
+        calls.append((snapshot.version, args, kwargs))
+        return len(calls)
+
+    return func, calls
+
+
+def test_memoized_key():
+    func, calls = counted()
+    v1, v2 = SimpleNamespace(version='v1'), SimpleNamespace(version='v2')
+
+    assert func(v1, 1, a=1, b=2) == func(v1, 1, b=2, a=1)
+    assert func(SimpleNamespace(version='v1'), 1, a=1, b=2) == 1  # keyed by version, not by object
+    assert func(v2, 1, a=1, b=2) == 2
+    assert func(v1, 2, a=1, b=2) == 3
+    assert func(v1, 1, a=1, b=3) == 4
+    assert len(calls) == 4
+    assert func.cache_info() == compute.CacheInfo(hits=2, misses=4, maxsize=128, currsize=4)
+
+
+def test_memoized_lru_eviction():
+    func, calls = counted(maxsize=2)
+    snapshot = SimpleNamespace(version='v1')
+
+    func(snapshot, 'a')
+    func(snapshot, 'b')
+    func(snapshot, 'a')  # hit, 'a' is now the most recently used
+    func(snapshot, 'c')  # evicts 'b'
+    assert func.cache_info().currsize == 2
+
+    func(snapshot, 'a')
+    assert len(calls) == 3
+    func(snapshot, 'b')
+    assert len(calls) == 4
+    assert func.cache_info() == compute.CacheInfo(hits=2, misses=4, maxsize=2, currsize=2)
+
+
+def test_memoized_cache_clear():
+    func, calls = counted()
+    snapshot = SimpleNamespace(version='v1')
+
+    func(snapshot, 1)
+    func(snapshot, 1)
+    func.cache_clear()
+    assert func.cache_info() == compute.CacheInfo(hits=0, misses=0, maxsize=128, currsize=0)
+    func(snapshot, 1)
+    assert len(calls) == 2
+
+
+def test_memoized_backend(snapshot):
+    seen = []
+
+    @compute.memoized()
+    def func(snapshot, x, backend=None):
+        seen.append(backend)
+        return x
+
+    func(snapshot, 1)
+    func(snapshot, 1)
+    assert len(seen) == 1 and isinstance(seen[0], PandasBackend)
+
+    # Same name as the default, same entry
+    func(snapshot, 1, backend=PandasBackend.from_snapshot(snapshot))
+    assert len(seen) == 1
+
+    other = SimpleNamespace(name='other')
+    func(snapshot, 1, backend=other)
+    func(snapshot, 1, backend=other)
+    assert seen[1:] == [other]
+
+
+def test_memoized_without_backend_param(snapshot):
+    @compute.memoized()
+    def func(snapshot, x):
+        return x
+
+    assert func(snapshot, 1) == 1
+    with pytest.raises(TypeError):
+        func(snapshot, 1, backend=PandasBackend.from_snapshot(snapshot))
+
+
+def baseline_slope_data(frame, start_year, end_year, highlighted, metric):
+    """The dashboard's original per-country loop"""
+    items = {}
+    for country in sorted(frame['country'].unique()):
+        start_data = frame[(frame['country'] == country) & (frame['year'] == start_year)]
+        end_data = frame[(frame['country'] == country) & (frame['year'] == end_year)]
+        if len(start_data) > 0 and len(end_data) > 0:
+            start, end = start_data[metric].values[0], end_data[metric].values[0]
+            if start > 0 and end > 0 and not np.isnan(start) and not np.isnan(end):
+                items[country] = {
+                    'start_val': start,
+                    'end_val': end,
+                    'pct_change': (end - start) / start * 100,
+                    'abs_change': end - start,
+                    'highlight': country in highlighted,
+                }
+    return items
+
+
+@pytest.mark.parametrize('metric', ['co2', 'gdp'])
+@pytest.mark.parametrize('offsets', [(0, -1), (3, 17), (10, 11), (-1, 0)])
+def test_slope_data_matches_baseline(snapshot, frame, metric, offsets):
+    start_year, end_year = snapshot.years[offsets[0]], snapshot.years[offsets[1]]
+    highlighted = tuple(snapshot.countries[1:4])
+    items = compute.slope_data(snapshot, start_year, end_year, highlighted, (metric,))[metric]
+    expected = baseline_slope_data(frame, start_year, end_year, highlighted, metric)
+
+    assert [item['country'] for item in items] == list(expected)
+    for item in items:
+        reference = expected[item['country']]
+        for key in ('start_val', 'end_val', 'pct_change', 'abs_change'):
+            assert item[key] == pytest.approx(reference[key])
+        assert item['highlight'] == reference['highlight']
+        assert item['color'] == (compute.highlight_color(item['country'], highlighted) or 'gray')
+
+
+def test_slope_data_year_without_rows(snapshot):
+    items = compute.slope_data(snapshot, snapshot.min_year - 1, snapshot.max_year, (), snapshot.metrics)
+    assert items == {metric: [] for metric in snapshot.metrics}
+
+
+def test_year_values_year_without_rows(snapshot):
+    values = compute.year_values(snapshot, snapshot.max_year + 1, 'co2')
+    assert list(values.index) == snapshot.countries
+    assert values['value'].isna().all() and values['log10'].isna().all()
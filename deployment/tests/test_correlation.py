@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import rolling_correlation
+
+
+def naive_rolling_correlation(df, years, window, by, min_count=11):
+    """pandas `corr` over the rows of every trailing window, per group"""
+    rows = df[df['co2'].notna() & df['gdp'].notna()]
+    groups = rows.groupby(by) if by is not None else [('All', rows)]
+    result = []
+    for group, group_df in groups:
+        for end in range(window - 1, len(years)):
+            in_window = group_df[group_df['year'].isin(years[end - window + 1:end + 1])]
+            if len(in_window) >= min_count:
+                result.append({'group': group, 'year': years[end], 'n': len(in_window),
+                               'correlation': in_window['co2'].corr(in_window['gdp'])})
+    return pd.DataFrame(result)
+
+
+@pytest.mark.parametrize('window, by', [(1, None), (5, None), (30, None), (2, 'region'), (5, 'region'), (30, 'region')])
+def test_rolling_correlation_matches_naive(snapshot, frame, window, by):
+    result = rolling_correlation(frame, snapshot.years, window, by=by)
+    expected = naive_rolling_correlation(frame, snapshot.years, window, by)
+
+    assert len(result) > 0
+    assert result[['group', 'year', 'n']].values.tolist() == expected[['group', 'year', 'n']].values.tolist()
+    np.testing.assert_allclose(result['correlation'], expected['correlation'], atol=1e-9)
+    assert ((result['lower'] <= result['correlation']) & (result['correlation'] <= result['upper'])).all()
+
+
+def test_rolling_correlation_min_count(snapshot, frame):
+    result = rolling_correlation(frame, snapshot.years, 1, by='region', min_count=1000)
+    assert result.empty
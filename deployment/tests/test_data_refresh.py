@@ -0,0 +1,99 @@
+import os
+
+import pytest
+import requests
+
+import data_refresh
+from data_refresh import DataRefresher
+
+
+class FakeSource:
+    """Stands in for the dataset server: serves `content` with `etag`, or fails while `down`"""
+
+    def __init__(self, content, etag='"1"'):
+        self.content = content
+        self.etag = etag
+        self.down = False
+        self.downloads = 0
+
+    def head(self, url, **kwargs):
+        if self.down:
+            raise requests.ConnectionError('source down')
+        return FakeResponse(200, headers={'ETag': self.etag})
+
+    def get(self, url, **kwargs):
+        if self.down:
+            raise requests.ConnectionError('source down')
+        self.downloads += 1
+        return FakeResponse(200, content=self.content)
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def source(frame, monkeypatch):
+    source = FakeSource(frame.to_csv(index=False).encode())
+    monkeypatch.setattr(data_refresh.requests, 'head', source.head)
+    monkeypatch.setattr(data_refresh.requests, 'get', source.get)
+    return source
+
+
+@pytest.fixture
+def refresher(frame, tmp_path):
+    return DataRefresher('https://example.org/co2gdp.csv', fallback=lambda: frame, data_dir=str(tmp_path))
+
+
+def test_first_failure_falls_back_to_sample(source, refresher):
+    source.down = True
+    assert refresher.refresh()
+    sample = refresher.current()
+    assert sample.version == 'sample' and isinstance(refresher.last_error, requests.ConnectionError)
+
+    # Later failures keep the sample instead of rebuilding it
+    assert not refresher.refresh()
+    assert refresher.current() is sample
+
+    source.down = False
+    assert refresher.refresh()
+    assert refresher.current().version != 'sample' and refresher.last_error is None
+
+
+def test_failure_without_fallback(source, tmp_path):
+    source.down = True
+    refresher = DataRefresher('https://example.org/co2gdp.csv', data_dir=str(tmp_path))
+    assert not refresher.refresh()
+    assert refresher.current() is None and refresher.last_error is not None
+
+
+def test_new_version_is_swapped_in(source, refresher, frame, tmp_path):
+    assert refresher.refresh()
+    old = refresher.current()
+    assert old.source_tag == '"1"' and old.quality is not None
+    assert os.path.exists(os.path.join(str(tmp_path), f"co2gdp-{old.version}.parquet"))
+
+    source.content = frame[frame['year'] > frame['year'].min()].to_csv(index=False).encode()
+    source.etag = '"2"'
+    assert refresher.refresh()
+    new = refresher.current()
+    assert new.version != old.version and new.years == old.years[1:]
+    # A rerun still holding the old snapshot keeps reading the old version
+    assert old.years[0] == frame['year'].min() and len(old.data.column('co2')) == len(frame)
+
+
+def test_unchanged_source_is_not_swapped(source, refresher):
+    assert refresher.refresh()
+    snapshot = refresher.current()
+
+    # Same tag: no download at all
+    assert not refresher.refresh()
+    assert source.downloads == 1
+
+    # New tag, same bytes: downloaded but the version is unchanged
+    source.etag = '"2"'
+    assert not refresher.refresh()
+    assert source.downloads == 2 and refresher.current() is snapshot
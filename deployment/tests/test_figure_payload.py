@@ -0,0 +1,123 @@
+import json
+import logging
+
+import geopandas as gpd
+import numpy as np
+import plotly.graph_objects as go
+import plotly.utils
+import pytest
+from shapely.geometry import Polygon
+
+import charts
+import compute
+from figure_payload import (BUILTIN_DEFAULTS, STYLE_PROPS, PayloadMeter, compact_figure, payload_bytes,
+                            round_geometry, round_significant)
+from metrics import get_metric
+
+
+def test_round_significant():
+    values = np.array([123456.789, 0.000123456789, -9.87654321, 0.0, np.nan, np.inf])
+    rounded = round_significant(values, 3)
+    np.testing.assert_array_equal(rounded[:4], [123000.0, 0.000123, -9.88, 0.0])
+    assert np.isnan(rounded[4]) and np.isinf(rounded[5])
+
+
+def test_round_geometry():
+    world = gpd.GeoDataFrame({'country': ['A']}, geometry=[Polygon([(0.12345, 1.98765), (2.5, 0.00049), (1, 1)])])
+    rounded = round_geometry(world)
+    np.testing.assert_array_equal(np.asarray(rounded.geometry[0].exterior.coords),
+                                  [(0.123, 1.988), (2.5, 0.0), (1, 1), (0.123, 1.988)])
+    # The input keeps its coordinates
+    assert world.geometry[0].exterior.coords[0] == (0.12345, 1.98765)
+
+
+def figures(snapshot):
+    """The dashboard's figures for the synthetic snapshot, three countries highlighted"""
+    co2, gdp = get_metric('co2'), get_metric('gdp')
+    highlighted = tuple(snapshot.countries[:3])
+    start_year, end_year, year = snapshot.min_year, snapshot.max_year, snapshot.years[10]
+    year_data = snapshot.data.frame(['co2', 'gdp'])
+    year_data = year_data[year_data['year'] == year]
+    yield 'time', charts.time_figure(
+        co2, snapshot.countries, compute.background_series(snapshot, 'co2', 800),
+        compute.line_data(snapshot, highlighted, ('co2',)), highlighted, start_year, end_year
+    )
+    yield 'slope', charts.slope_figure(
+        co2, compute.slope_data(snapshot, start_year, end_year, highlighted, ('co2',))['co2'], start_year, end_year
+    )
+    yield 'scatter', charts.scatter_figure(year_data, gdp, co2, snapshot.region_colors)
+    yield 'region', charts.region_figure(compute.region_averages(snapshot, year, 'co2'), co2,
+                                         snapshot.region_colors, year)
+    yield 'correlation', charts.correlation_figure(
+        compute.year_correlation(snapshot, 'co2', 'gdp'), gdp, co2, snapshot.region_colors,
+        compute.windowed_correlation(snapshot, 'co2', 'gdp', 5, by='region'), 5
+    )
+
+
+def test_compaction_never_grows_payload(snapshot):
+    for name, fig in figures(snapshot):
+        before = payload_bytes(fig)
+        assert payload_bytes(compact_figure(fig)) <= before, name
+
+
+def effective_styles(fig):
+    """Per trace the style a browser applies: the trace's value over the template default over Plotly's default"""
+    styles = []
+    for trace in fig.data:
+        defaults = getattr(fig.layout.template.data, trace.type)
+        default = defaults[0].to_plotly_json() if defaults else {}
+        spec = trace.to_plotly_json()
+        style = {}
+        for prop in STYLE_PROPS:
+            value = spec.get(prop, default.get(prop, BUILTIN_DEFAULTS.get(prop)))
+            if isinstance(value, dict) and isinstance(default.get(prop), dict):
+                value = {**default[prop], **value}
+            style[prop] = json.dumps(value, sort_keys=True, cls=plotly.utils.PlotlyJSONEncoder)
+        styles.append(style)
+    return styles
+
+
+def test_hoisting_keeps_effective_styles(snapshot):
+    for name, fig in figures(snapshot):
+        before = effective_styles(fig)
+        assert effective_styles(compact_figure(fig)) == before, name
+
+
+def test_rare_style_is_not_hoisted(snapshot):
+    """Three label traces skipping hover must not pin hoverinfo on every background line"""
+    fig = next(fig for name, fig in figures(snapshot) if name == 'time')
+    compact_figure(fig)
+    assert 'hoverinfo' not in fig.layout.template.data.scatter[0].to_plotly_json()
+    assert sum(trace.hoverinfo is not None for trace in fig.data) == 3
+
+
+def test_shared_style_is_hoisted():
+    fig = go.Figure([go.Scatter(x=[0, 1], y=[i, i], mode='lines', line=dict(color='gray', width=1))
+                     for i in range(20)])
+    before = payload_bytes(fig)
+    compact_figure(fig)
+    assert fig.layout.template.data.scatter[0].line.color == 'gray'
+    assert all(trace.line.color is None and trace.mode is None for trace in fig.data)
+    assert payload_bytes(fig) < before
+
+
+def test_payload_meter_budgets(caplog):
+    meter = PayloadMeter(1000, budgets={'map': 5000, 'free': None})
+    with caplog.at_level(logging.WARNING, logger='figure_payload'):
+        meter.record('time', 900)
+        meter.record('slope', 1200)
+        meter.record('map', 4000)
+        meter.record('free', 10 ** 9)
+
+    assert [chart['over_budget'] for chart in meter.charts] == [False, True, False, False]
+    assert [chart['budget_bytes'] for chart in meter.charts] == [1000, 1000, 5000, None]
+    assert meter.total_bytes == 900 + 1200 + 4000 + 10 ** 9
+    assert len(caplog.records) == 1 and 'slope' in caplog.records[0].getMessage()
+
+
+@pytest.mark.parametrize('digits', [3, 6])
+def test_compaction_rounds_data(digits):
+    fig = go.Figure(go.Scatter(x=[1.23456789, 2.0], y=[9.87654321e6, np.nan], text=[None, None]))
+    compact_figure(fig, digits=digits)
+    np.testing.assert_array_equal(fig.data[0].x, round_significant([1.23456789, 2.0], digits))
+    assert fig.data[0].text is None
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from lod import downsample_panel, lttb
+
+
+@pytest.fixture(scope='module')
+def series():
+    rng = np.random.default_rng(4)
+    x = np.arange(1000, dtype=float)
+    return x, np.cumsum(rng.normal(0, 1, len(x)))
+
+
+@pytest.mark.parametrize('threshold', [3, 10, 257, 999])
+def test_lttb_keeps_endpoints_and_order(series, threshold):
+    x, y = series
+    x_out, y_out = lttb(x, y, threshold)
+
+    assert len(x_out) == threshold
+    assert (x_out[0], y_out[0]) == (x[0], y[0])
+    assert (x_out[-1], y_out[-1]) == (x[-1], y[-1])
+    assert np.all(np.diff(x_out) > 0)
+    # Every kept point is one of the input points
+    np.testing.assert_array_equal(y_out, y[np.searchsorted(x, x_out)])
+
+
+@pytest.mark.parametrize('threshold', [0, 2, 1000, 5000])
+def test_lttb_returns_short_input_unchanged(series, threshold):
+    x, y = series
+    x_out, y_out = lttb(x, y, threshold)
+    assert x_out is x and y_out is y
+
+
+def test_lttb_keeps_peak(series):
+    x, y = series
+    y = y.copy()
+    y[500] = y.max() + 100
+    _, y_out = lttb(x, y, 50)
+    assert y[500] in y_out
+
+
+def test_downsample_panel_skips_missing():
+    values = np.array([[1.0, np.nan, 3.0, 4.0, np.nan], [np.nan] * 5])
+    (x0, y0), (x1, y1) = downsample_panel([2000, 2001, 2002, 2003, 2004], values, 10)
+    np.testing.assert_array_equal(x0, [2000, 2002, 2003])
+    np.testing.assert_array_equal(y0, [1.0, 3.0, 4.0])
+    assert len(x1) == 0 and len(y1) == 0
@@ -0,0 +1,79 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_refresh import build_snapshot
+from panel_store import PRUNE_GRACE, current_version, load_store, load_store_geo, write_store
+
+
+@pytest.fixture(scope='module')
+def stored(snapshot, tmp_path_factory):
+    path = tmp_path_factory.mktemp('store')
+    write_store(snapshot, str(path))
+    return path, load_store(str(path))
+
+
+def test_round_trip_metadata(snapshot, stored):
+    path, loaded = stored
+    assert current_version(str(path)) == snapshot.version
+    for name in ('version', 'source_tag', 'refreshed_at', 'countries', 'years', 'regions', 'region_colors',
+                 'metrics', 'quality'):
+        assert getattr(loaded, name) == getattr(snapshot, name), name
+    assert load_store_geo(str(path)) is None
+
+
+def test_round_trip_data(snapshot, stored):
+    _, loaded = stored
+    columns = list(snapshot.data.columns)
+    assert list(loaded.data.columns) == columns
+    # Text columns come back as categoricals of the stored codes
+    pd.testing.assert_frame_equal(loaded.data.frame(columns).astype(object),
+                                  snapshot.data.frame(columns).astype(object))
+
+
+@pytest.mark.parametrize('name', ['panel', 'valid', 'log_panel', 'region_means'])
+def test_round_trip_indexes(snapshot, stored, name):
+    _, loaded = stored
+    for metric in snapshot.metrics:
+        np.testing.assert_array_equal(getattr(loaded, name)[metric], getattr(snapshot, name)[metric])
+
+
+def test_round_trip_rankings_and_correlation(snapshot, stored):
+    _, loaded = stored
+    years = snapshot.years
+    for metric in snapshot.metrics:
+        np.testing.assert_array_equal(loaded.changes[metric].pct, snapshot.changes[metric].pct)
+        assert loaded.changes[metric].top_k(years[0], years[-1]) == snapshot.changes[metric].top_k(years[0], years[-1])
+    for pair in snapshot.year_correlation:
+        np.testing.assert_array_equal(loaded.year_correlation[pair], snapshot.year_correlation[pair])
+    np.testing.assert_array_equal(loaded.trajectories.vectors, snapshot.trajectories.vectors)
+
+
+def test_new_version_becomes_current(snapshot, frame, tmp_path):
+    path = tmp_path / 'store'
+    write_store(snapshot, str(path))
+    newer = build_snapshot(frame[frame['year'] > frame['year'].min()], version='test-newer')
+    write_store(newer, str(path))
+    assert current_version(str(path)) == 'test-newer'
+    assert load_store(str(path)).years == newer.years
+
+
+def test_replaced_version_outlives_grace(snapshot, tmp_path):
+    path = str(tmp_path / 'store')
+    write_store(snapshot, path)
+    old = load_store(path)
+    for version in ('test-2', 'test-3'):
+        write_store(build_snapshot(snapshot.data.frame(snapshot.data.columns), version=version), path)
+    # The worker still on the first version can map its files
+    assert os.path.isdir(os.path.join(path, snapshot.version))
+    np.testing.assert_array_equal(old.panel['co2'], snapshot.panel['co2'])
+
+    # The first version was replaced by test-2 longer than the grace period ago
+    replaced = time.time() - PRUNE_GRACE - 1
+    os.utime(os.path.join(path, snapshot.version), (replaced - 1, replaced - 1))
+    os.utime(os.path.join(path, 'test-2'), (replaced, replaced))
+    write_store(build_snapshot(snapshot.data.frame(snapshot.data.columns), version='test-4'), path)
+    assert sorted(os.listdir(path)) == ['CURRENT', 'test-2', 'test-3', 'test-4']
@@ -0,0 +1,82 @@
+import json
+import pstats
+from datetime import datetime, timezone
+
+import pytest
+
+import profiling
+from profiling import ProfileStore, in_profiled_run, profiling_requested, run_profiled
+
+SCRIPT = """
+import profiling
+
+def rerun_work():
+    return sum(range(10000))
+
+assert profiling.in_profiled_run()
+rerun_work()
+if FAIL:
+    raise RuntimeError('script failed')
+"""
+
+
+@pytest.fixture
+def script(tmp_path):
+    def write(fail=False):
+        path = tmp_path / 'app.py'
+        path.write_text(f"FAIL = {fail}\n" + SCRIPT)
+        return str(path)
+    return write
+
+
+def test_ring_buffer_keeps_newest():
+    store = ProfileStore(size=3)
+    for i in range(5):
+        store.add(datetime.now(timezone.utc), 0.1, {'i': i}, b'')
+    assert [profile.id for profile in store.profiles()] == [5, 4, 3]
+    assert [profile.widget_state['i'] for profile in store.profiles()] == [4, 3, 2]
+
+
+def test_profile_is_downloadable(script, tmp_path):
+    store = ProfileStore()
+    assert run_profiled(script(), store, {'year': 2000})
+    assert not in_profiled_run()
+
+    profile, = store.profiles()
+    assert 'rerun_work' in profile.summary()
+    assert json.loads(profile.state_json())['widget_state'] == {'year': 2000}
+    # The download is a regular pstats dump
+    path = tmp_path / profile.filename
+    path.write_bytes(profile.stats)
+    assert any(name == 'rerun_work' for _, _, name in pstats.Stats(str(path)).stats)
+
+
+def test_failed_rerun_is_stored(script):
+    store = ProfileStore()
+    with pytest.raises(RuntimeError, match='script failed'):
+        run_profiled(script(fail=True), store, {})
+    assert len(store.profiles()) == 1 and not in_profiled_run()
+    # The lock was released, the next rerun is profiled again
+    assert run_profiled(script(), store, {})
+
+
+def test_one_profiled_rerun_at_a_time(script):
+    store = ProfileStore()
+    with profiling._profiler_lock:
+        assert not run_profiled(script(), store, {})
+    assert store.profiles() == []
+
+
+@pytest.mark.parametrize('env, params, expected', [
+    ({'CO2GDP_PROFILE': '1'}, {}, True),
+    ({'CO2GDP_PROFILE_TOKEN': 'secret'}, {'profile': 'secret'}, True),
+    ({'CO2GDP_PROFILE_TOKEN': 'secret'}, {'profile': 'guess'}, False),
+    ({'CO2GDP_PROFILE_TOKEN': 'secret'}, {}, False),
+    ({}, {'profile': ''}, False),
+])
+def test_profiling_requested(monkeypatch, env, params, expected):
+    monkeypatch.delenv('CO2GDP_PROFILE', raising=False)
+    monkeypatch.delenv('CO2GDP_PROFILE_TOKEN', raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    assert profiling_requested(params) is expected
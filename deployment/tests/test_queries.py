@@ -0,0 +1,81 @@
+import gc
+import os
+
+import pandas as pd
+import pytest
+
+from benchmark_queries import workload
+from column_store import FrameColumnStore, KEY_COLUMNS, ParquetColumnStore
+from data_refresh import KEEP_VERSIONS, build_snapshot, write_columnar
+from queries import QUERIES, DuckDBBackend, PandasBackend, dtype_name, parquet_in_use, write_parquet
+
+# Queries whose rows come in any order, compared sorted
+UNORDERED = {'metric_values': ['value'], 'year_rows': ['country'], 'metric_pairs': ['region', 'year']}
+
+
+@pytest.fixture(scope='module')
+def parquet_path(frame, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('parquet') / 'data.parquet')
+    write_parquet(frame, path)
+    return path
+
+
+@pytest.fixture(scope='module', params=['frame', 'snapshot', 'parquet snapshot'])
+def pandas_backend(request, frame, snapshot, parquet_path):
+    if request.param == 'frame':
+        return PandasBackend(FrameColumnStore(frame))
+    if request.param == 'snapshot':
+        return PandasBackend.from_snapshot(snapshot)
+    return PandasBackend.from_snapshot(build_snapshot(ParquetColumnStore(parquet_path), version='parquet'))
+
+
+@pytest.fixture(scope='module')
+def duckdb_backend(parquet_path):
+    return DuckDBBackend(parquet_path)
+
+
+def normalized(name, result):
+    if name in UNORDERED:
+        result = result.sort_values(UNORDERED[name], kind='stable')
+    return result.reset_index(drop=True)
+
+
+def test_workload_covers_every_query(frame):
+    assert sorted(name for name, _ in workload(frame)) == sorted(QUERIES)
+
+
+@pytest.mark.parametrize('name', QUERIES)
+def test_backends_agree(frame, pandas_backend, duckdb_backend, name):
+    params = dict(workload(frame))[name]
+    pd.testing.assert_frame_equal(normalized(name, pandas_backend.run(name, **params)),
+                                  normalized(name, duckdb_backend.run(name, **params)), check_dtype=False)
+
+
+def test_schema_dtype_names(duckdb_backend):
+    schema = duckdb_backend.run('schema').set_index('column')['dtype'].to_dict()
+    assert schema == {'country': 'string', 'region': 'string', 'year': 'int64', 'co2': 'float64', 'gdp': 'float64'}
+    assert set(schema) == set(KEY_COLUMNS) | {'co2', 'gdp'}
+
+
+@pytest.mark.parametrize('dtype, name', [('VARCHAR', 'string'), ('BIGINT', 'int64'), ('DOUBLE', 'float64'),
+                                         ('double', 'float64'), ('large_string', 'string'), ('str', 'string'),
+                                         ('string[pyarrow]', 'string'), ('object', 'string'), ('int64', 'int64')])
+def test_dtype_name(dtype, name):
+    assert dtype_name(dtype) == name
+
+
+def test_pruning_keeps_parquet_of_open_backend(frame, tmp_path):
+    directory = str(tmp_path)
+    first = write_columnar(frame, directory, 'v0')
+    os.utime(first, (0, 0))
+    backend = DuckDBBackend(first)
+    for i in range(1, KEEP_VERSIONS + 2):
+        os.utime(write_columnar(frame, directory, f'v{i}'), (i, i))
+    assert os.path.abspath(first) in parquet_in_use()
+    assert backend.run('overview')['n_rows'][0] == len(frame)
+    assert len(os.listdir(directory)) == KEEP_VERSIONS + 1
+
+    del backend
+    gc.collect()
+    write_columnar(frame, directory, 'v9')
+    assert not os.path.exists(first)
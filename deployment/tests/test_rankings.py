@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from rankings import ChangeIndex
+
+
+@pytest.fixture(scope='module')
+def index():
+    rng = np.random.default_rng(3)
+    values = rng.lognormal(0, 1, (60, 12))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[rng.random(values.shape) < 0.05] = 0.0
+    values[rng.random(values.shape) < 0.05] = -2.0
+    return ChangeIndex([f"Country {i:02d}" for i in range(60)], range(2000, 2012), values)
+
+
+def full_sort(index, start_year, end_year, largest):
+    """(country, pct_change) of every country with positive values in both years, sorted by change"""
+    i, j = index.years.index(start_year), index.years.index(end_year)
+    start, end = index.values[:, i], index.values[:, j]
+    changes = [
+        (country, (e - s) / s * 100)
+        for country, s, e in zip(index.countries, start, end)
+        if s > 0 and e > 0 and np.isfinite(s) and np.isfinite(e)
+    ]
+    return sorted(changes, key=lambda change: change[1], reverse=largest)
+
+
+@pytest.mark.parametrize('largest', [True, False])
+@pytest.mark.parametrize('k', [1, 5, 100])
+@pytest.mark.parametrize('years', [(2000, 2011), (2003, 2004), (2005, 2009)])
+def test_top_k_matches_full_sort(index, years, k, largest):
+    movers = index.top_k(*years, k=k, largest=largest)
+    expected = full_sort(index, *years, largest)[:k]
+
+    assert [mover['country'] for mover in movers] == [country for country, _ in expected]
+    # The index stores float32, the result is recomputed from the values
+    assert [mover['pct_change'] for mover in movers] == pytest.approx([pct for _, pct in expected])
+
+
+def test_extremes_match_full_sort(index):
+    decrease, increase = index.extremes(2001, 2010)
+    ordered = full_sort(index, 2001, 2010, largest=True)
+    assert increase['country'] == ordered[0][0]
+    assert decrease['country'] == ordered[-1][0]
+
+
+@pytest.mark.parametrize('years, k', [((2005, 2005), 5), ((2009, 2002), 5), ((1999, 2005), 5), ((2000, 2011), 0)])
+def test_top_k_empty(index, years, k):
+    assert index.top_k(*years, k=k) == []
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from similarity import METHODS, TrajectoryIndex
+
+YEARS = np.arange(1990, 2020)
+
+
+@pytest.fixture(scope='module')
+def index():
+    t = np.linspace(0, 1, len(YEARS))
+    rng = np.random.default_rng(3)
+    co2 = {
+        'base': t ** 2,
+        'scaled': 3 + 5 * t ** 2,  # same shape at another level and scale
+        'shifted': np.roll(t ** 2, 2),  # same shape two years later
+        'reversed': (1 - t) ** 2,
+        'noise': rng.random(len(YEARS)),
+        'short': np.where(YEARS == 2000, 1.0, np.nan),  # a single valid point
+    }
+    co2['shifted'][:2] = 0
+    log_panel = {'co2': np.array(list(co2.values())), 'gdp': np.array([t] * len(co2))}
+    log_panel['gdp'][-1] = np.nan
+    return TrajectoryIndex(list(co2), YEARS, log_panel, length=16)
+
+
+def test_countries_need_two_points(index):
+    assert 'short' not in index and index.query('short') == []
+    assert index.countries == ['base', 'scaled', 'shifted', 'reversed', 'noise']
+    assert index.vectors.shape == (5, 32)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_same_shape_ranks_first(index, method):
+    result = index.query('base', k=4, method=method)
+    assert [country for country, _ in result][0] == 'scaled'
+    assert 'base' not in dict(result)
+    scores = [score for _, score in result]
+    if method == 'cosine':
+        assert scores[0] == pytest.approx(1, abs=1e-5) and scores == sorted(scores, reverse=True)
+    else:
+        assert scores[0] == pytest.approx(0, abs=1e-3) and scores == sorted(scores)
+
+
+def test_dtw_matches_shifted_path(index):
+    distances = dict(index.query('base', k=4, method='dtw'))
+    assert distances['shifted'] < distances['reversed']
+
+
+def test_query_limits(index):
+    assert index.query('unknown') == []
+    assert index.query('base', k=0) == []
+    assert len(index.query('base', k=10)) == len(index.countries) - 1
+
+
+def test_from_vectors_round_trip(index):
+    loaded = TrajectoryIndex.from_vectors(index.countries, index.vectors, metrics=index.metrics, length=index.length)
+    for method in METHODS:
+        assert loaded.query('noise', k=3, method=method) == index.query('noise', k=3, method=method)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_snapshot_queries(snapshot, method):
+    trajectories = snapshot.trajectories
+    country = trajectories.countries[0]
+    result = trajectories.query(country, k=5, method=method)
+    assert len(result) == 5 and country not in dict(result)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from validation import DataQuality, check_schema, validate_frame
+
+
+def test_validate_frame_drops_incomplete_rows(frame):
+    df = frame.copy()
+    df['year'] = df['year'].astype(float)
+    df.loc[3, 'year'] = np.nan
+    df.loc[7, 'region'] = None
+    df.loc[11, 'country'] = None
+
+    clean, quality = validate_frame(df)
+    assert pd.api.types.is_integer_dtype(clean['year'])
+    assert quality.incomplete == 3
+    assert quality.rows == len(clean) == len(frame) - 3
+    assert 'without country, region or year' in quality.headline
+
+
+def test_validate_frame_drops_duplicates(frame):
+    df = pd.concat([frame, frame.iloc[:2]], ignore_index=True)
+    clean, quality = validate_frame(df)
+    assert len(clean) == len(frame)
+    assert quality.duplicates == 2 and quality.incomplete == 0
+    assert quality.duplicate_keys == list(frame.iloc[:2][['country', 'year']].itertuples(index=False, name=None))
+
+
+def test_fractional_year_is_rejected(frame):
+    df = frame.assign(year=frame['year'] + 0.5)
+    with pytest.raises(ValueError, match="column 'year'"):
+        validate_frame(df)
+    with pytest.raises(ValueError, match="missing column 'region'"):
+        check_schema(frame.drop(columns='region'))
+
+
+def test_quality_dict_round_trip(frame):
+    _, quality = validate_frame(frame)
+    assert DataQuality.from_dict(quality.to_dict()) == quality
+    # Stores written before incomplete rows were counted
+    values = quality.to_dict()
+    del values['incomplete']
+    assert DataQuality.from_dict(values).incomplete == 0
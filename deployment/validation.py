@@ -0,0 +1,126 @@
+"""Load-time validation of a downloaded dataset version.
+
+Runs once per version, before the snapshot is built: drops rows without a
+country, region or year, checks the schema, drops duplicate (country, year)
+rows and counts missing and non-positive values per indicator. The vectorized
+masks and log10 panels built from the same rule (`positive_mask`, `log_panel`)
+are what the charts and indexes use downstream, so no chart re-checks single
+values on a rerun.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from column_store import KEY_COLUMNS
+from metrics import available_metrics, get_metric
+
+
+@dataclass(frozen=True)
+class DataQuality:
+    """What validation found in one dataset version"""
+    rows: int  # rows kept after dropping incomplete rows and duplicates
+    duplicates: int  # extra rows for an already seen (country, year), dropped
+    incomplete: int = 0  # rows without a country, region or year, dropped
+    duplicate_keys: list = field(default_factory=list)  # up to 10 of the duplicated (country, year) pairs
+    missing: dict = field(default_factory=dict)  # metric -> rows without a value
+    non_positive: dict = field(default_factory=dict)  # metric -> rows with a value <= 0, left out of log scales
+
+    @property
+    def headline(self):
+        """What was dropped, in a few words"""
+        text = f"{self.duplicates:,} duplicate rows dropped"
+        if self.incomplete:
+            text += f", {self.incomplete:,} rows without country, region or year dropped"
+        return text
+
+    def summary(self):
+        """One row per indicator, for display"""
+        return pd.DataFrame([{
+            'Indicator': get_metric(metric).title,
+            'Missing': self.missing[metric],
+            'Not Positive': self.non_positive[metric],
+            'Usable on Log Scale': self.rows - self.missing[metric] - self.non_positive[metric],
+        } for metric in self.missing])
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'duplicates': self.duplicates,
+            'incomplete': self.incomplete,
+            'duplicate_keys': [list(key) for key in self.duplicate_keys],
+            'missing': self.missing,
+            'non_positive': self.non_positive,
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(
+            rows=values['rows'],
+            duplicates=values['duplicates'],
+            incomplete=values.get('incomplete', 0),  # absent in stores written before it was counted
+            duplicate_keys=[tuple(key) for key in values['duplicate_keys']],
+            missing=values['missing'],
+            non_positive=values['non_positive'],
+        )
+
+
+def check_schema(df):
+    """Raise ValueError unless the key columns exist and every registry metric present is numeric"""
+    problems = [f"missing column '{column}'" for column in KEY_COLUMNS if column not in df.columns]
+    if 'year' in df.columns and not pd.api.types.is_integer_dtype(df['year']):
+        problems.append(f"column 'year' has type {df['year'].dtype}, expected integers")
+    problems += [
+        f"indicator '{metric}' has type {df[metric].dtype}, expected numbers"
+        for metric in available_metrics(df.columns) if not pd.api.types.is_numeric_dtype(df[metric])
+    ]
+    if problems:
+        raise ValueError("Invalid dataset: " + "; ".join(problems))
+
+
+def positive_mask(values):
+    """True where a value is finite and > 0, i.e. can be shown on a log scale"""
+    values = np.asarray(values, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return np.isfinite(values) & (values > 0)
+
+
+def log_panel(values, valid):
+    """log10 of the values marked valid, NaN everywhere else"""
+    values = np.asarray(values, dtype=float)
+    return np.log10(values, out=np.full(values.shape, np.nan), where=valid)
+
+
+def drop_incomplete(df):
+    """Drop rows without country, region or year; returns the frame and the number of rows dropped.
+
+    A single empty year cell makes pandas read the whole column as float, which
+    `check_schema` would reject, so an integral float year is cast back to int.
+    """
+    incomplete = df[[column for column in KEY_COLUMNS if column in df.columns]].isna().any(axis=1)
+    if incomplete.any():
+        df = df[~incomplete].reset_index(drop=True)
+    if 'year' in df.columns and pd.api.types.is_float_dtype(df['year']) and (df['year'] % 1 == 0).all():
+        df = df.assign(year=df['year'].astype('int64'))
+    return df, int(incomplete.sum())
+
+
+def validate_frame(df):
+    """Drop incomplete and duplicate (country, year) rows and check the schema; returns the frame and its DataQuality"""
+    df, incomplete = drop_incomplete(df)
+    check_schema(df)
+    duplicated = df.duplicated(['country', 'year'], keep='first')
+    duplicate_keys = df.loc[duplicated, ['country', 'year']].drop_duplicates().head(10)
+    if duplicated.any():
+        df = df[~duplicated].reset_index(drop=True)
+
+    metrics = available_metrics(df.columns)
+    quality = DataQuality(
+        rows=len(df),
+        duplicates=int(duplicated.sum()),
+        incomplete=incomplete,
+        duplicate_keys=list(duplicate_keys.itertuples(index=False, name=None)),
+        missing={metric: int(df[metric].isna().sum()) for metric in metrics},
+        non_positive={metric: int((df[metric] <= 0).sum()) for metric in metrics},
+    )
+    return df, quality